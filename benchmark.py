@@ -0,0 +1,316 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import os
+# render without a display, must be set before Qt is loaded
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import time
+import tempfile
+import contextlib
+import tracemalloc
+import argparse
+import logging
+import numpy as np
+import yaml
+import irsdk
+import configobj
+from PyQt5 import QtGui, QtCore
+from PyQt5.QtWidgets import QApplication
+from state import State
+from telemetry import read_frame
+from memorymap import MemoryMap, BUF_COUNT
+import main
+import overlay
+import drawers
+
+# variables written into synthetic dumps: name, irsdk var type, count
+SYNTHETIC_VARS = (
+    ('SessionTime', 5, 1), ('SessionTick', 2, 1), ('SessionNum', 2, 1), ('SessionState', 2, 1),
+    ('CamCarIdx', 2, 1), ('CamCameraNumber', 2, 1),
+    ('IsReplayPlaying', 1, 1), ('ReplayFrameNumEnd', 2, 1),
+    ('Speed', 4, 1), ('RPM', 4, 1), ('Gear', 2, 1), ('FuelLevel', 4, 1), ('Throttle', 4, 1), ('Brake', 4, 1),
+    ('CarIdxLap', 2, 64), ('CarIdxLapDistPct', 4, 64), ('CarIdxTrackSurface', 2, 64),
+    ('CarIdxRPM', 4, 64), ('CarIdxGear', 2, 64),
+)
+
+
+def summary(samples):
+    # milliseconds
+    samples = np.asarray(samples) * 1000
+    return samples.mean(), np.percentile(samples, 95), np.percentile(samples, 99)
+
+
+def print_table(title, rows):
+    print(title)
+    print('{:<20} {:>10} {:>10} {:>10} {:>12}'.format('', 'mean ms', 'p95 ms', 'p99 ms', 'alloc KiB'))
+    for name, samples, alloc in rows:
+        mean, p95, p99 = summary(samples)
+        print('{:<20} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.1f}'.format(name, mean, p95, p99, alloc / 1024))
+
+
+def startup(test_file, cfg):
+    main.ir = irsdk.IRSDK()
+    if not main.ir.startup(test_file=test_file):
+        logging.error('Unable to load test file: %s' % test_file)
+        sys.exit(1)
+    main.cfg = cfg
+    main.state = State()
+    frame = main.main()
+    if frame is None:
+        logging.error('No telemetry in test file: %s' % test_file)
+        sys.exit(1)
+    return frame
+
+
+def session_info(car_count, update=1):
+    drivers = [dict(CarIdx=i, UserName='Driver %d' % i, AbbrevName='Driver, D%d' % i, UserID=1000 + i,
+        CarNumber=i + 1, LicLevel=4 + i % 20, LicSubLevel=300 + i, IsSpectator=0) for i in range(car_count)]
+    positions = [dict(Position=i + 1, ClassPosition=i, CarIdx=i, Lap=i // 20, Time=90.0 + i * 0.5,
+        FastestTime=89.0 + i * 0.1, LastTime=90.0 + i * 0.1 + update * 0.001) for i in range(car_count)]
+    sections = dict(
+        WeekendInfo=dict(TrackLength='5.00 km', EventType='Race'),
+        SessionInfo=dict(Sessions=[dict(SessionNum=0, SessionLaps=20, SessionTime='unlimited',
+            SessionType='Race', ResultsAverageLapTime=90.0, ResultsPositions=positions)]),
+        SplitTimeInfo=dict(Sectors=[dict(SectorNum=i, SectorStartPct=i / 3) for i in range(3)]),
+        DriverInfo=dict(DriverCarIdx=0, DriverCarSLFirstRPM=6000.0, DriverCarRedLine=8000.0, Drivers=drivers),
+        CameraInfo=dict(Groups=[dict(GroupNum=1, GroupName='Nose')]),
+        QualifyResultsInfo=dict(Results=[dict(Position=i, CarIdx=i) for i in range(car_count)]),
+    )
+    # irsdk finds each section by its heading and the blank line after it
+    text = '---\n' + '\n'.join(yaml.safe_dump({key: value}, default_flow_style=False, sort_keys=False)
+        for key, value in sections.items()) + '\n...\n'
+    return text.encode('utf-8')
+
+
+class SyntheticDump:
+    # a field of car_count cars lapping, written into a MemoryMap so pyirsdk
+    # reads it exactly like the sim; tick() moves every car on
+
+    def __init__(self, car_count):
+        self.car_count = car_count
+        info = session_info(car_count)
+        # leave room for session info to grow when it is rewritten
+        self.map = MemoryMap(SYNTHETIC_VARS, len(info) * 2)
+        self.path = self.map.path
+        self.buffers = [self.map.values(i) for i in range(BUF_COUNT)]
+
+        cars = np.arange(64)
+        active = cars < car_count
+        self.lap_times = 90.0 + cars * 0.2
+        self.pcts = np.where(active, (cars * 0.37) % 1, -1.0)
+        self.laps = np.where(active, 1, -1)
+        self.tick_count = 0
+        self.session_time = 0.0
+        self.session_info_update = 1
+        self.map.writeSessionInfo(self.session_info_update, info)
+        for values in self.buffers:
+            values['SessionState'][0] = 4
+            values['CamCameraNumber'][0] = 1
+            values['Speed'][0] = 50.0
+            values['RPM'][0] = 7000.0
+            values['Gear'][0] = 3
+            values['FuelLevel'][0] = 20.0
+            values['Throttle'][0] = 0.8
+            values['CarIdxTrackSurface'][:] = np.where(active, irsdk.TrkLoc.on_track, irsdk.TrkLoc.not_in_world)
+            values['CarIdxRPM'][:] = 7000.0
+            values['CarIdxGear'][:] = 3
+        for i in range(BUF_COUNT):
+            self.tick()
+
+    def tick(self, dt=1 / 60):
+        self.tick_count += 1
+        self.session_time += dt
+        active = self.pcts >= 0
+        pcts = self.pcts + np.where(active, dt / self.lap_times, 0)
+        self.laps = np.where(active & (pcts >= 1), self.laps + 1, self.laps)
+        self.pcts = np.where(active, pcts % 1, -1.0)
+        buf = self.map.nextBuffer()
+        values = self.buffers[buf]
+        values['SessionTime'][0] = self.session_time
+        values['SessionTick'][0] = self.tick_count
+        values['CarIdxLap'][:] = self.laps
+        values['CarIdxLapDistPct'][:] = self.pcts
+        self.map.publish(buf, self.tick_count)
+
+    def update_session_info(self):
+        # new results, the way the sim rewrites session info every lap
+        self.session_info_update += 1
+        self.map.writeSessionInfo(self.session_info_update, session_info(self.car_count, self.session_info_update))
+
+    def close(self):
+        # views over the map have to go before it can be closed
+        self.buffers = None
+        self.map.close()
+
+
+def measure(paint, iterations, warmup, clear=None):
+    for i in range(warmup):
+        paint()
+    samples = []
+    for i in range(iterations):
+        if clear is not None:
+            clear()
+        start = time.perf_counter()
+        paint()
+        samples.append(time.perf_counter() - start)
+
+    # python side allocations only, a separate pass as tracing skews timing
+    tracemalloc.start()
+    peak = 0
+    for i in range(min(iterations, 50)):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        paint()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return samples, peak
+
+
+def make_drawers(ir, state, cfg, out_dir):
+    file_cfg = {'file_path': os.path.join(out_dir, 'relative.png'), 'file_format': cfg.get('file_format', 'png'),
+        'file_rate': cfg.get('file_rate', 10)}
+    return [
+        ('bg', drawers.GreenScreenDrawer()),
+        ('timestamp', drawers.TimeStampDrawer(ir, state)),
+        ('laps', drawers.LapDrawer(ir, state)),
+        ('inputs', drawers.InputsDrawer(ir, state)),
+        ('positions', drawers.PositionsDrawer(ir, state)),
+        ('qual', drawers.QualifyingTimeDrawer(ir, state, '')),
+        ('delta', drawers.DeltaDrawer(ir, state)),
+        ('setup', drawers.SetupDrawer(ir, state, 'Baseline')),
+        ('tach', drawers.TachDrawer(ir, state, cfg.get('speed_units', 'kph'))),
+        ('file', drawers.FileDrawer(ir, state, file_cfg)),
+    ]
+
+
+def bench_render(args, cfg):
+    app = QApplication([])
+    frame = startup(args.test, cfg)
+    out_dir = tempfile.mkdtemp()
+    img = QtGui.QImage(args.width, args.height, QtGui.QImage.Format_ARGB32_Premultiplied)
+
+    def clear():
+        img.fill(QtCore.Qt.transparent)
+
+    rows = []
+    for key, drawer in make_drawers(main.ir, main.state, cfg, out_dir):
+        def paint():
+            p = QtGui.QPainter(img)
+            drawer.draw(p if not drawer.rect().isEmpty() else None, frame)
+            p.end()
+        samples, alloc = measure(paint, args.iterations, args.warmup, clear)
+        rows.append((key, samples, alloc))
+        if hasattr(drawer, 'close'):
+            drawer.close()
+
+    # the whole overlay through paintEvent, the way the window is painted
+    window = overlay.OverlayWindow()
+    window.resize(args.width, args.height)
+    for key, drawer in make_drawers(main.ir, main.state, cfg, out_dir):
+        if key != 'file':
+            window.addDrawer(drawer, key)
+    window.refresh(frame)
+    def paint():
+        window.render(img)
+    samples, alloc = measure(paint, args.iterations, args.warmup, clear)
+    rows.append(('overlay', samples, alloc))
+
+    print_table('%d iterations of %s at %dx%d' % (args.iterations, args.test, args.width, args.height), rows)
+
+
+def bench_pipeline(args, cfg):
+    stages = ('read_frame', 'intervals', 'timing', 'reference', 'speeds', 'speed_rpm', 'lap_ses_time', 'drivers', 'position', 'standings_sort',
+        'session_change', 'tick')
+    results = {}
+    for car_count in args.cars:
+        dump = SyntheticDump(car_count)
+        samples = {stage: [] for stage in stages}
+        # keep the prints in the update loop out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            try:
+                main.ir = irsdk.IRSDK()
+                main.ir.startup(test_file=dump.path)
+                main.cfg = cfg
+                main.state = State()
+                # the first tick connects and runs on_session_change
+                main.main()
+                state = main.state
+
+                def timed(stage, func, *args):
+                    start = time.perf_counter()
+                    result = func(*args)
+                    samples[stage].append(time.perf_counter() - start)
+                    return result
+
+                # every stage on its own, with the once a second throttles cleared
+                for i in range(args.iterations):
+                    dump.tick()
+                    frame = timed('read_frame', read_frame, main.ir)
+                    state.frame = frame
+                    state.cur_session_time = frame['SessionTime']
+                    timed('intervals', state.intervals.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+                    timed('timing', state.timing.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+                    timed('reference', state.reference.update, state.cam_car_idx, state.cur_session_time,
+                        frame['CarIdxLapDistPct'][state.cam_car_idx], state.timing)
+                    timed('speeds', state.speeds.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+                    timed('speed_rpm', main.update_speed_rpm, frame)
+                    state.last_time_update_lap_ses_time = -1
+                    timed('lap_ses_time', main.update_lap_ses_time, frame)
+                    state.last_time_update_drivers = -1
+                    timed('drivers', main.update_drivers)
+                    state.last_time_update_positions = -1
+                    timed('position', main.update_position, frame)
+                    state.standings.running = state.standings.running[:0]
+                    timed('standings_sort', state.standings.update_running, state.drivers, state.cam_car_idx,
+                        state.track_length, state.intervals)
+
+                # whole ticks as the scheduler runs them
+                for i in range(args.iterations):
+                    dump.tick()
+                    timed('tick', main.main)
+
+                # session info rewritten by the sim, parsed again on next read
+                for i in range(min(args.iterations, 100)):
+                    dump.update_session_info()
+                    timed('session_change', main.on_session_change)
+                    state.last_time_update_drivers = -1
+                    main.update_drivers()
+            finally:
+                main.ir.shutdown()
+                dump.close()
+        results[car_count] = samples
+
+    print('mean us per call, %d iterations' % args.iterations)
+    print('{:<16}'.format('cars') + ''.join('{:>10}'.format(c) for c in args.cars))
+    for stage in stages:
+        print('{:<16}'.format(stage) + ''.join('{:>10.1f}'.format(np.mean(results[c][stage]) * 1e6)
+            for c in args.cars))
+    print('{:<16}'.format('ticks/s') + ''.join('{:>10.0f}'.format(1 / np.mean(results[c]['tick']))
+        for c in args.cars))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configfile', help='config file', default='config.ini')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    render = subparsers.add_parser('render', help='time every drawer painting into an offscreen image')
+    render.add_argument('test', help='irsdk mmap dump to render')
+    render.add_argument('-n', '--iterations', type=int, default=500)
+    render.add_argument('--warmup', type=int, default=20)
+    render.add_argument('--width', type=int, default=1280)
+    render.add_argument('--height', type=int, default=720)
+    render.set_defaults(run=bench_render)
+
+    pipeline = subparsers.add_parser('pipeline', help='time each stage of the update tick for growing fields')
+    pipeline.add_argument('--cars', type=int, nargs='+', default=[1, 8, 16, 32, 48, 64])
+    pipeline.add_argument('-n', '--iterations', type=int, default=1000)
+    pipeline.set_defaults(run=bench_pipeline)
+
+    args = parser.parse_args()
+    logging.basicConfig(format='{levelname:>8}: {message}', style='{', level=logging.WARN)
+    cfg = configobj.ConfigObj(args.configfile) if os.path.isfile(args.configfile) else main.default_config()
+    args.run(args, cfg)
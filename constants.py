@@ -5,10 +5,21 @@ from PyQt5 import QtGui
 
 class Color:
     WHITE = QtGui.QColor(255, 255, 255, 255)
+    WHITE_TRANSPARENT = QtGui.QColor(255, 255, 255, 96)
+    WHITE_DIM = QtGui.QColor(200, 200, 200, 200)
     LIGHT_GREY = QtGui.QColor(196, 196, 196, 255)
     GREY = QtGui.QColor(36, 31, 32, 255)
     GREY_TRANSPARENT = QtGui.QColor(36, 31, 32, 128)
+    GREY_FAINT = QtGui.QColor(36, 31, 32, 48)
     YELLOW = QtGui.QColor(255, 225, 0, 255)
     GREEN = QtGui.QColor(0, 225, 0, 255)
     GREEN_SCREEN = QtGui.QColor(0, 255, 0, 255)
     RED = QtGui.QColor(225, 0, 0, 255)
+    PURE_RED = QtGui.QColor(255, 0, 0, 255)
+    BLUE = QtGui.QColor(0, 128, 255, 255)
+
+class Priority:
+    # high priority drawers are painted every frame they change, low priority
+    # ones are cached and may show their last output when a frame runs late
+    HIGH = 0
+    LOW = 1
@@ -8,19 +8,29 @@ from PyQt5 import QtGui, QtCore, QtWidgets
 from PyQt5.QtWidgets import (QApplication, QMainWindow)
 import ctypes
 import drawers
+from profiler import profiler
 
 class CamerasWindow(QtWidgets.QWidget):
     ir = None
-    def __init__(self, ir, state, parent=None):
+    def __init__(self, ir, state, submit=None, parent=None):
         super(CamerasWindow, self).__init__(parent)
         self.setWindowTitle('Cameras')
         self.ir = ir
         self.state = state
+        # irsdk belongs to the telemetry thread when there is one, camera
+        # switches are handed to it and the groups come from the published state
+        self.submit = submit
+        self.groups = []
         self.setGeometry(1304, 30, 500, 100)
         lo = QtWidgets.QGridLayout()
         self.setLayout(lo)
         self.refresh_layout()
 
+        # the camera groups arrive with the session info
+        self.groups_timer = QtCore.QTimer(self)
+        self.groups_timer.timeout.connect(self.check_groups)
+        self.groups_timer.start(1000)
+
     def clear_layout(self):
         while self.layout().count() > 0:
             item = self.layout().takeAt(0)
@@ -31,6 +41,10 @@ class CamerasWindow(QtWidgets.QWidget):
             if w:
                 w.deleteLater()
 
+    def check_groups(self):
+        if self.state.camera_groups != self.groups:
+            self.refresh_layout()
+
     def refresh_layout(self):
         r, c = (0, 0)
         max_cols = 5
@@ -42,12 +56,13 @@ class CamerasWindow(QtWidgets.QWidget):
 
         c += 1
 
-        for group in self.ir['CameraInfo']['Groups']:
+        self.groups = self.state.camera_groups
+        for group in self.groups:
             if c == max_cols:
                 r += 1
                 c = 0
 
-            button = QtWidgets.QPushButton(group['GroupName'])
+            button = QtWidgets.QPushButton(group)
             button.clicked.connect(self.on_button_click)
             lo.addWidget(button, r, c)
             c += 1
@@ -61,27 +76,36 @@ class CamerasWindow(QtWidgets.QWidget):
 
     def on_button_click(self):
         group = self.group_index_from_name(self.sender().text())
-        car_index = self.ir['DriverInfo']['DriverCarIdx']
-        car_num = str(self.ir['DriverInfo']['Drivers'][car_index]['CarNumber'])
-        print(group, self.ir['DriverInfo']['DriverCarIdx'], car_num)
-        if not self.ir.cam_switch_num(car_num, group, 0):
-            raise ctypes.WinError()
+        car_index = self.state.my_car_idx
+        if group is None or car_index < 0:
+            return
+        car_num = self.state.drivers.car_number[car_index].lstrip('#')
+        print(group, car_index, car_num)
+        if self.submit is None:
+            switch_camera(self.ir, car_num, group)
+        else:
+            self.submit(switch_camera, self.ir, car_num, group)
 
     def group_index_from_name(self, name):
         index = 1
-        for group in self.ir['CameraInfo']['Groups']:
-            if group['GroupName'] == name:
+        for group in self.groups:
+            if group == name:
                 return index
             else:
                 index += 1
 
+
+def switch_camera(ir, car_num, group):
+    if not ir.cam_switch_num(car_num, group, 0):
+        raise ctypes.WinError()
+
 class ControlsWindow(QtWidgets.QMainWindow):
 
     ir = None
     overlayWindow = None
     camerasWindow = None
 
-    def __init__(self, ir, state, cfg, parent=None):
+    def __init__(self, ir, state, cfg, submit=None, parent=None):
         super(ControlsWindow, self).__init__(parent)
 
         self.setWindowTitle('Director')
@@ -94,7 +118,7 @@ class ControlsWindow(QtWidgets.QMainWindow):
         self.overlayWindow = overlay.OverlayWindow()
         self.overlayWindow.show()
 
-        self.camerasWindow = CamerasWindow(ir, state)
+        self.camerasWindow = CamerasWindow(ir, state, submit)
         self.camerasWindow.show()
 
         self.setCentralWidget(QtWidgets.QWidget(self))
@@ -138,33 +162,57 @@ class ControlsWindow(QtWidgets.QMainWindow):
         self.qual_le = QtWidgets.QLineEdit()
         lo.addWidget(self.qual_le, 6, 1)
 
+        self.delta_cb = QtWidgets.QCheckBox('Show Delta')
+        self.delta_cb.stateChanged.connect(self.toggleDelta)
+        self.delta_cb.setChecked(False)
+        lo.addWidget(self.delta_cb, 7, 0)
+
         self.setup_cb = QtWidgets.QCheckBox('Show Fuel/Setup')
         self.setup_cb.stateChanged.connect(self.toggleSetup)
         self.setup_cb.setChecked(False)
-        lo.addWidget(self.setup_cb, 7, 0)
+        lo.addWidget(self.setup_cb, 8, 0)
 
         self.setup_le = QtWidgets.QLineEdit()
-        lo.addWidget(self.setup_le, 7, 1)
+        lo.addWidget(self.setup_le, 8, 1)
 
         line = QtWidgets.QFrame()
         line.setFrameShape(QtWidgets.QFrame.HLine)
         line.setFrameShadow(QtWidgets.QFrame.Sunken)
-        lo.addWidget(line, 8, 0, 1, 2)
+        lo.addWidget(line, 9, 0, 1, 2)
 
         self.tach_cb = QtWidgets.QCheckBox('Show Tach')
         self.tach_cb.stateChanged.connect(self.toggleTach)
         self.tach_cb.setChecked(True)
-        lo.addWidget(self.tach_cb, 9, 0)
+        lo.addWidget(self.tach_cb, 10, 0)
 
         self.green_cb = QtWidgets.QCheckBox('Show Green Background')
         self.green_cb.stateChanged.connect(self.toggleBackground)
         self.green_cb.setChecked(False)
-        lo.addWidget(self.green_cb, 10, 0)
+        lo.addWidget(self.green_cb, 11, 0)
 
         self.file_cb = QtWidgets.QCheckBox('Write Relative to File')
         self.file_cb.stateChanged.connect(self.toggleFile)
         self.file_cb.setChecked(False)
-        lo.addWidget(self.file_cb, 11, 0)
+        lo.addWidget(self.file_cb, 12, 0)
+
+        self.profile_cb = QtWidgets.QCheckBox('Profile')
+        self.profile_cb.stateChanged.connect(self.toggleProfile)
+        lo.addWidget(self.profile_cb, 13, 0)
+
+        reset_profile_button = QtWidgets.QPushButton('Reset Profile')
+        reset_profile_button.clicked.connect(self.resetProfile)
+        lo.addWidget(reset_profile_button, 13, 1)
+
+        self.profile_te = QtWidgets.QPlainTextEdit()
+        self.profile_te.setReadOnly(True)
+        self.profile_te.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.profile_te.setVisible(False)
+        lo.addWidget(self.profile_te, 14, 0, 1, 2)
+
+        # histograms are read once a second, not on every tick
+        self.profile_timer = QtCore.QTimer(self)
+        self.profile_timer.timeout.connect(self.showProfile)
+        self.profile_cb.setChecked(profiler.enabled)
 
     def clearUserUI(self):
         self.lap_cb.setChecked(False)
@@ -184,7 +232,7 @@ class ControlsWindow(QtWidgets.QMainWindow):
             self.overlayWindow.removeDrawer(key)
 
     def toggleFile(self):
-        self.toggleDrawer('file', drawers.FileDrawer(self.ir, self.state))
+        self.toggleDrawer('file', drawers.FileDrawer(self.ir, self.state, self.cfg))
 
     def toggleBackground(self):
         self.toggleDrawer('bg', drawers.GreenScreenDrawer())
@@ -192,6 +240,9 @@ class ControlsWindow(QtWidgets.QMainWindow):
     def toggleQualifyingTime(self):
         self.toggleDrawer('qual', drawers.QualifyingTimeDrawer(self.ir, self.state, self.qual_le.text()))
 
+    def toggleDelta(self):
+        self.toggleDrawer('delta', drawers.DeltaDrawer(self.ir, self.state))
+
     def toggleSetup(self):
         self.toggleDrawer('setup', drawers.SetupDrawer(self.ir, self.state, self.setup_le.text()))
 
@@ -210,6 +261,22 @@ class ControlsWindow(QtWidgets.QMainWindow):
     def toggleTach(self):
         self.toggleDrawer('tach', drawers.TachDrawer(self.ir, self.state, self.cfg['speed_units']))
 
+    def toggleProfile(self):
+        profiler.enabled = self.profile_cb.isChecked()
+        self.profile_te.setVisible(profiler.enabled)
+        if profiler.enabled:
+            self.showProfile()
+            self.profile_timer.start(1000)
+        else:
+            self.profile_timer.stop()
+
+    def resetProfile(self):
+        profiler.reset()
+        self.showProfile()
+
+    def showProfile(self):
+        self.profile_te.setPlainText(profiler.text())
+
 
     def closeEvent(self, event):
         self.overlayWindow.close()
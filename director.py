@@ -8,6 +8,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import (QApplication, QMainWindow)
 from controls import ControlsWindow
 import sys
+import time
 import ctypes
 
 VERSION = ''
@@ -40,14 +41,16 @@ if __name__ == '__main__':
         if args.test:
             main()
         else:
+            # wait for the sim without spinning a core
             while not ir.is_connected:
-                pass
+                time.sleep(1)
+                ir.startup()
 
             app = QApplication([])
             controlsWindow = ControlsWindow(ir)
             timer = QtCore.QTimer();
             timer.timeout.connect(main)
-            timer.start(1/30);
+            timer.start(1000 // 30);
             sys.exit(app.exec_())
 
 
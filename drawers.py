@@ -5,9 +5,11 @@ from state import State
 from PyQt5 import QtGui, QtCore
 import math
 import constants
+import resources
+import layers
+from writer import ImageWriter
 import logging
 import irsdk
-import random
 import configobj
 from datetime import datetime
 
@@ -38,436 +40,477 @@ def strFromTime(time, decimal_places = 2):
 
 
 class TimeStampDrawer:
+    priority = constants.Priority.LOW
+    refresh_rate = 10
+
     def __init__(self, ir, state):
         self.ir = ir
         self.state = state
+        self.font = resources.font('Calibri', 8, QtGui.QFont.Normal)
+        self.pen = resources.pen(constants.Color.WHITE_TRANSPARENT)
 
-    def draw(self, widget):
-        pen = QtGui.QPen()
-        pen.setColor(QtGui.QColor(255,255,255,96))
-        p = QtGui.QPainter()
-        p.begin(widget)
-        p.setPen(pen)
+    def rect(self):
+        return QtCore.QRect(5, 0, 110, 25)
+
+    def fingerprint(self, frame):
+        return int(self.state.cur_session_time * 100)
+
+    def draw(self, p, frame):
+        p.setPen(self.pen)
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        p.setFont(QtGui.QFont('Calibri', 8, QtGui.QFont.Normal))
+        p.setFont(self.font)
         p.drawText(5,0,110,25, QtCore.Qt.AlignLeft, '%0.02f' % self.state.cur_session_time)
-        p.end()
 
 
 class GreenScreenDrawer:
+    priority = constants.Priority.LOW
+    refresh_rate = 0
+
     def __init__(self):
-        pass
+        self.layer = layers.StaticLayer(self.paintBackground)
 
-    def draw(self, widget):
-        pen = QtGui.QPen()
-        pen.setColor(QtGui.QColor(0,255,0,255))
-        p = QtGui.QPainter()
-        p.begin(widget)
-        p.setPen(pen)
+    def rect(self):
+        return QtCore.QRect(0, 0, 1280, 720)
+
+    def fingerprint(self, frame):
+        return ()
+
+    def draw(self, p, frame):
+        self.layer.draw(p)
+
+    def paintBackground(self, p, key):
         p.fillRect(0, 0, 1280, 720, constants.Color.GREEN_SCREEN)
-        p.end()
 
 
 class LapDrawer:
+    priority = constants.Priority.LOW
+    refresh_rate = 0
+
     def __init__(self, ir, state):
         self.ir = ir
         self.state = state
+        self.font = resources.font('Calibri', 10, QtGui.QFont.Bold)
+        self.white_pen = resources.pen(constants.Color.WHITE)
+        self.grey_pen = resources.pen(constants.Color.LIGHT_GREY)
+        self.background = layers.StaticLayer(self.paintBackground, (600, 22, 80, 22))
 
-    def draw(self, widget):
-        self.paintBackground(widget)
-        self.paintRelativeText(widget)
+    def rect(self):
+        return QtCore.QRect(585, 20, 110, 25)
 
-    def paintBackground(self, widget):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def fingerprint(self, frame):
+        return (frame['CarIdxLap'][self.state.cam_car_idx], self.state.session_laps)
+
+    def draw(self, p, frame):
+        self.background.draw(p)
+        self.paintRelativeText(p, frame)
+
+    def paintBackground(self, p, key):
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.fillRect(600, 22, 80, 22, constants.Color.GREY_TRANSPARENT)
-        p.end()
 
-    def paintRelativeText(self, widget):
+    def paintRelativeText(self, p, frame):
 
-        lap = self.ir['CarIdxLap'][self.state.cam_car_idx]
+        lap = frame['CarIdxLap'][self.state.cam_car_idx]
         if lap == self.state.session_laps:
             lap_str = 'FINAL LAP'
         elif lap > self.state.session_laps:
             lap_str = 'RACE OVER'
         else:
             lap_str = 'LAP %s/%s' % (lap, self.state.session_laps)
-        p = QtGui.QPainter()
         if lap == 0:
-            color = constants.Color.LIGHT_GREY
+            pen = self.grey_pen
         elif lap > self.state.session_laps:
-            color = constants.Color.LIGHT_GREY
+            pen = self.grey_pen
         else:
-            color = constants.Color.WHITE
-        p.begin(widget)
-        pen = QtGui.QPen()
-        pen.setColor(color)
+            pen = self.white_pen
         p.setPen(pen)
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
-        p.drawText(585,20,110,25, QtCore.Qt.AlignCenter, lap_str)
-        p.end()
+        p.setFont(self.font)
+        resources.drawStaticText(p, 585,20,110,25, QtCore.Qt.AlignCenter, resources.staticText(lap_str, self.font))
 
 
 class QualifyingTimeDrawer:
-    def __init__(self, ir, state, qual_time):
+    priority = constants.Priority.HIGH
+    refresh_rate = 0
+
+    def __init__(self, ir, state, qual_time, outlap=None):
         self.ir = ir
         self.state = state
-        self.outlap = self.ir['CarIdxLap'][self.state.cam_car_idx]
+        # the lap the camera car is on when the drawer is switched on, unless
+        # given, as when rendering part of a session that started earlier
+        if outlap is None:
+            outlap = self.state.frame['CarIdxLap'][self.state.cam_car_idx]
+        self.outlap = outlap
         self.start_time = -1
+        self.font = resources.font('Calibri', 14, QtGui.QFont.Bold)
+        self.background = layers.StaticLayer(self.paintBackground, (570, 25, 135, 35))
 
         if(len(qual_time) > 0):
             self.lap_time = timeFromStr(qual_time)
         else:
             self.lap_time = -1
 
-    def draw(self, widget):
-        self.paintBackground(widget)
-        self.paintText(widget)
+    def rect(self):
+        return QtCore.QRect(570, 25, 135, 35)
+
+    def fingerprint(self, frame):
+        lap = frame['CarIdxLap'][self.state.cam_car_idx]
+        if lap == self.outlap or lap == self.outlap + 2:
+            return (lap, self.lap_time)
+        return (lap, int(self.state.cur_session_time * 1000))
 
-    def paintBackground(self, widget):
-        lap = self.ir['CarIdxLap'][self.state.cam_car_idx]
+    def draw(self, p, frame):
+        lap = frame['CarIdxLap'][self.state.cam_car_idx]
         if lap == self.outlap:
             color = constants.Color.LIGHT_GREY
         elif lap == self.outlap + 2:
             color = constants.Color.GREEN
         else:
             color = constants.Color.YELLOW
+        self.background.draw(p, color.rgba())
+        self.paintText(p, frame)
 
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def paintBackground(self, p, rgba):
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.shear(math.radians(-10), 0)
-        p.fillRect(585+3, 30, 110, 25, color)
-        p.end()
+        p.fillRect(585+3, 30, 110, 25, QtGui.QColor.fromRgba(rgba))
 
-    def paintText(self, widget):
-        lap = self.ir['CarIdxLap'][self.state.cam_car_idx]
+    def paintText(self, p, frame):
+        cam_car_idx = self.state.cam_car_idx
+        lap = frame['CarIdxLap'][cam_car_idx]
+        timing = self.state.timing
         if lap == self.outlap:
             str = '-.---'
         elif lap == self.outlap + 2:
             if self.lap_time == -1:
-                self.lap_time = self.state.drivers[self.state.my_car_idx]['position_info']['FastestTime'] # self.state.cur_session_time - self.start_time
-
-#             time = self.state.drivers[self.state.my_car_idx]['position_info']['FastestTime']
+                # the hot lap as timed across the line, or the sim's own
+                # best when the lap was not timed from start to finish
+                self.lap_time = timing.last_lap_time[cam_car_idx]
+                if math.isnan(self.lap_time):
+                    self.lap_time = self.state.drivers.fastest_time[self.state.my_car_idx]
             str = strFromTime(self.lap_time, decimal_places=3)
-#             self.state.drivers[self.state.my_car_idx]['position_info']['FastestTime']
         else:
-            if self.start_time == -1:
-                self.start_time = self.state.cur_session_time
-            time = self.state.cur_session_time - self.start_time
+            time = timing.lapTime(cam_car_idx, self.state.cur_session_time)
+            if math.isnan(time):
+                if self.start_time == -1:
+                    self.start_time = self.state.cur_session_time
+                time = self.state.cur_session_time - self.start_time
             str = strFromTime(time, decimal_places=3)
 
-        p = QtGui.QPainter()
-        p.begin(widget)
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        p.setFont(QtGui.QFont('Calibri', 14, QtGui.QFont.Bold))
+        p.setFont(self.font)
         p.drawText(585-3,30,110,25, QtCore.Qt.AlignCenter, str)
-        p.end()
 
 
-class InputsDrawer:
+class DeltaDrawer:
+    priority = constants.Priority.HIGH
+    refresh_rate = 0
+
+    # seconds either side of the reference the bar shows in full
+    bar_range = 1
+
     def __init__(self, ir, state):
         self.ir = ir
         self.state = state
+        self.font = resources.font('Calibri', 14, QtGui.QFont.Bold)
+        self.white_pen = resources.pen(constants.Color.WHITE)
+        self.background = layers.StaticLayer(self.paintBackground, (700, 25, 150, 35))
+
+    def rect(self):
+        return QtCore.QRect(700, 25, 150, 35)
+
+    def delta(self):
+        return self.state.reference.delta
 
-    def draw(self, widget):
-        self.paintBackground(widget)
-        self.paintRelativeText(widget)
+    def fingerprint(self, frame):
+        delta = self.delta()
+        return None if math.isnan(delta) else int(round(delta * 100))
+
+    def draw(self, p, frame):
+        self.background.draw(p)
+        delta = self.delta()
+        if math.isnan(delta):
+            text = '-.--'
+        else:
+            # green while ahead of the reference, red while behind
+            width = 50 * max(-1, min(delta / self.bar_range, 1))
+            color = constants.Color.GREEN if delta < 0 else constants.Color.RED
+            p.save()
+            p.shear(math.radians(-10), 0)
+            p.fillRect(QtCore.QRectF(776 + min(width, 0), 51, abs(width), 4), color)
+            p.restore()
+            text = '{:+.2f}'.format(delta)
 
-    def paintBackground(self, widget):
+        p.setPen(self.white_pen)
+        p.setRenderHint(QtGui.QPainter.TextAntialiasing)
+        p.setFont(self.font)
+        p.drawText(715,30,110,25, QtCore.Qt.AlignCenter, text)
+
+    def paintBackground(self, p, key):
+        p.setRenderHint(QtGui.QPainter.Antialiasing)
+        p.shear(math.radians(-10), 0)
+        p.fillRect(718+3, 30, 110, 25, constants.Color.GREY_TRANSPARENT)
+
+
+class InputsDrawer:
+    priority = constants.Priority.HIGH
+    refresh_rate = 0
+
+    gear_strs = ('R', 'N', '1', '2', '3', '4', '5')
+
+    def __init__(self, ir, state):
+        self.ir = ir
+        self.state = state
+        self.speed_font = resources.font('Calibri', 30, QtGui.QFont.Bold)
+        self.label_font = resources.font('Calibri', 12, QtGui.QFont.Bold)
+        self.gear_font = resources.font('Calibri', 10, QtGui.QFont.Bold)
+        self.grey_pen = resources.pen(constants.Color.GREY_TRANSPARENT)
+        self.yellow_pen = resources.pen(constants.Color.YELLOW)
+        self.label_pen = resources.pen(constants.Color.GREY_FAINT)
+        self.throttle_text = resources.staticText('THROTTLE', self.label_font)
+        self.brake_text = resources.staticText('BRAKE', self.label_font)
+        self.kph_text = resources.staticText('KPH', self.gear_font)
+        self.gear_texts = [resources.staticText(gear_str, self.gear_font) for gear_str in self.gear_strs]
+        self.background = layers.StaticLayer(self.paintStaticBackground, (15, 25, 265, 85))
+        self.foreground = layers.StaticLayer(self.paintStaticText, (100, 25, 185, 65))
+
+    def rect(self):
+        return QtCore.QRect(15, 25, 270, 85)
+
+    def fingerprint(self, frame):
+        return (int(frame['Throttle'] * 135), int(frame['Brake'] * 135), frame['Gear'], int(round(frame['Speed'])))
+
+    def draw(self, p, frame):
+        self.background.draw(p)
+        self.paintBackground(p, frame)
+        self.paintRelativeText(p, frame)
+        self.foreground.draw(p)
+
+    def paintStaticBackground(self, p, key):
         offset = 10
-        p = QtGui.QPainter()
-        p.begin(widget)
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.shear(math.radians(-10), 0)
         # speed
         p.fillRect(30+offset, 30, 100, 55, constants.Color.YELLOW)
         # throttle
         p.fillRect(135+offset, 30, 135, 25, constants.Color.GREY_TRANSPARENT)
-        p.fillRect(135+offset, 30, 135*self.ir['Throttle'], 25, constants.Color.GREEN)
         # brake
         p.fillRect(135+offset, 60, 135, 25, constants.Color.GREY_TRANSPARENT)
-        p.fillRect(135+offset, 60, 135*self.ir['Brake'], 25, constants.Color.RED)
         # gear
         for i in range(0, 7):
-            if i == (self.ir['Gear'] + 1):
-                color = constants.Color.YELLOW
-            else:
-                color = constants.Color.GREY_TRANSPARENT
-            p.fillRect(30+offset+35*i, 90, 30, 15, color)
+            p.fillRect(30+offset+35*i, 90, 30, 15, constants.Color.GREY_TRANSPARENT)
 
-        p.end()
+    def paintBackground(self, p, frame):
+        offset = 10
+        p.save()
+        p.setRenderHint(QtGui.QPainter.Antialiasing)
+        p.shear(math.radians(-10), 0)
+        # throttle
+        p.fillRect(QtCore.QRectF(135+offset, 30, 135*frame['Throttle'], 25), constants.Color.GREEN)
+        # brake
+        p.fillRect(QtCore.QRectF(135+offset, 60, 135*frame['Brake'], 25), constants.Color.RED)
+        # gear
+        gear = frame['Gear'] + 1
+        if 0 <= gear < 7:
+            p.fillRect(30+offset+35*gear, 90, 30, 15, constants.Color.YELLOW)
+        p.restore()
 
-    def paintRelativeText(self, widget):
-        grey_color = constants.Color.GREY_TRANSPARENT
-        yellow_color = constants.Color.YELLOW
-        pen = QtGui.QPen()
-        pen.setColor(grey_color)
-        p = QtGui.QPainter()
-        p.begin(widget)
-        p.setPen(pen)
+    def paintStaticText(self, p, key):
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        # speed
-        speed = int(round(self.ir['Speed']))
-        p.setFont(QtGui.QFont('Calibri', 30, QtGui.QFont.Bold))
-        p.drawText(30,32,72,55, QtCore.Qt.AlignRight, str(speed))
         # throttle
-        pen.setColor(QtGui.QColor(36, 31, 32, 48))
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Calibri', 12, QtGui.QFont.Bold))
-        p.drawText(145,33,135,25, QtCore.Qt.AlignLeft, 'THROTTLE')
+        p.setPen(self.label_pen)
+        p.setFont(self.label_font)
+        resources.drawStaticText(p, 145,33,135,25, QtCore.Qt.AlignLeft, self.throttle_text)
         # brake
-        p.drawText(145,63,135,25, QtCore.Qt.AlignLeft, 'BRAKE')
+        resources.drawStaticText(p, 145,63,135,25, QtCore.Qt.AlignLeft, self.brake_text)
+        # kph
+        p.rotate(-90)
+        p.setPen(self.grey_pen)
+        p.setFont(self.gear_font)
+        resources.drawStaticText(p, -72,104,135,25, QtCore.Qt.AlignLeft, self.kph_text)
+
+    def paintRelativeText(self, p, frame):
+        p.setPen(self.grey_pen)
+        p.setRenderHint(QtGui.QPainter.TextAntialiasing)
+        # speed
+        speed = int(round(frame['Speed']))
+        p.setFont(self.speed_font)
+        resources.drawStaticText(p, 30,32,72,55, QtCore.Qt.AlignRight, resources.staticText(str(speed), self.speed_font))
         # gear
-        gear = self.ir['Gear'] + 1
-        gear_strs = ('R', 'N', '1', '2', '3', '4', '5')
-        p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
+        gear = frame['Gear'] + 1
+        p.setFont(self.gear_font)
         for i in range(0, 7):
             if i == gear:
-                color = grey_color
+                p.setPen(self.grey_pen)
             else:
-                color = yellow_color
-            pen.setColor(color)
-            p.setPen(pen)
-            p.drawText(24+35*i,90,30,15, QtCore.Qt.AlignCenter, gear_strs[i])
-        p.end()
-        # kph
-        p = QtGui.QPainter()
-        p.begin(widget)
-        p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        p.rotate(-90)
-        pen = QtGui.QPen()
-        pen.setColor(grey_color)
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
-        p.drawText(-72,104,135,25, QtCore.Qt.AlignLeft, 'KPH')
-        p.end()
+                p.setPen(self.yellow_pen)
+            resources.drawStaticText(p, 24+35*i,90,30,15, QtCore.Qt.AlignCenter, self.gear_texts[i])
+
+
+def rowPens():
+    return (
+        resources.pen(constants.Color.YELLOW),
+        resources.pen(constants.Color.LIGHT_GREY),
+        resources.pen(constants.Color.WHITE),
+    )
 
 
 class PositionsDrawer:
+    priority = constants.Priority.LOW
+    refresh_rate = 1
+
     def __init__(self, ir, state):
         self.ir = ir
         self.state = state
         self.show_results = False
-
-    def draw(self, widget):
-        finished_drivers = self.getFinishedDriverInfo()
-        if(len(finished_drivers)):
-            drivers = [d for d in finished_drivers if d['position_info']['Lap'] == 0]
-            if len(drivers) >= self.state.drivers_on_lead_lap:
-                drivers = finished_drivers
-            self.paintRelativeBackgrounds(widget, drivers)
-            self.paintResultsText(widget, drivers)
+        self.font = resources.font('Calibri', 10, QtGui.QFont.Bold)
+        self.yellow_pen, self.grey_pen, self.white_pen = rowPens()
+
+    def rect(self):
+        standings = self.state.standings
+        drivers = standings.results if len(standings.finished) else standings.running
+        return QtCore.QRect(1280 - 270, 20, 250, len(drivers) * 16 + 10)
+
+    def fingerprint(self, frame):
+        return (self.state.standings.version, self.state.my_car_idx)
+
+    def draw(self, p, frame):
+        standings = self.state.standings
+        if(len(standings.finished)):
+            drivers = standings.results
+            self.paintRelativeBackgrounds(p, drivers)
+            self.paintResultsText(p, drivers)
         else:
-            print(self.state.event_type)
-            drivers = self.getDriverInfo()
-            self.paintRelativeBackgrounds(widget, drivers)
-            self.paintRelativeText(widget, drivers)
-
-    def paintResultsText(self, widget, drivers):
-        p = QtGui.QPainter()
-        p.begin(widget)
-        p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        for i, driver in enumerate(drivers):
-            pos_info = driver['position_info']
+            drivers = standings.running
+            self.paintRelativeBackgrounds(p, drivers)
+            self.paintRelativeText(p, drivers)
 
-            if pos_info['Position'] == 1:
+    def paintResultsText(self, p, drivers):
+        p.setRenderHint(QtGui.QPainter.TextAntialiasing)
+        p.setFont(self.font)
+        table = self.state.drivers
+        for i, car_idx in enumerate(drivers):
+            if table.result_position[car_idx] == 1:
                 info = strFromTime(self.state.race_time)
-            elif pos_info['Lap'] == 0:
-                info = '-' + strFromTime(pos_info['Time'])
+            elif table.result_lap[car_idx] == 0:
+                info = '-' + strFromTime(table.result_time[car_idx])
             else:
-                info = '-%d L' % pos_info['Lap']
+                info = '-%d L' % table.result_lap[car_idx]
 
-            if pos_info['CarIdx'] == self.state.my_car_idx:
-                color = constants.Color.YELLOW
+            if car_idx == self.state.my_car_idx:
+                p.setPen(self.yellow_pen)
             else:
-                color = constants.Color.WHITE
+                p.setPen(self.white_pen)
 
-            pen = QtGui.QPen()
-            pen.setColor(color)
-            p.setPen(pen)
-            p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
             width = 1280
             xpos = width - 265 + 5
             ypos = 20 + (16 * i) + 5
-            p.drawText(xpos, ypos,30,25, QtCore.Qt.AlignLeft, str(i + 1))
-            p.drawText(xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, '#%s' % (drivers[i]['driver_info']['CarNumber']))
-            p.drawText(xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, drivers[i]['driver_info']['UserName'])
+            resources.drawStaticText(p, xpos, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(str(i + 1), self.font))
+            resources.drawStaticText(p, xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.car_number[car_idx], self.font))
+            resources.drawStaticText(p, xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, resources.staticText(table.user_name[car_idx], self.font))
             p.drawText(xpos + 170, ypos,60,25, QtCore.Qt.AlignRight, info)
-        p.end()
 
-    def paintRelativeBackgrounds(self, widget, drivers):
+    def paintRelativeBackgrounds(self, p, drivers):
         width = 1280
         xpos = width - 270
         ypos = 20
         height = len(drivers) * 16 + 10
-        p = QtGui.QPainter()
-        p.begin(widget)
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.fillRect(xpos, ypos, 250, height, constants.Color.GREY_TRANSPARENT)
-        p.end()
 
-    def paintRelativeText(self, widget, drivers):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def paintRelativeText(self, p, drivers):
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        for i in range(len(drivers)):
-            if drivers[i]['position_info']['CarIdx'] == self.state.my_car_idx:
-                color = constants.Color.YELLOW
-            elif  drivers[i]['track_location'] == irsdk.TrkLoc.IN_PIT_STALL or drivers[i]['track_location'] == irsdk.TrkLoc.APROACHING_PITS:
-                color = constants.Color.LIGHT_GREY
+        p.setFont(self.font)
+        table = self.state.drivers
+        for i, car_idx in enumerate(drivers):
+            if car_idx == self.state.my_car_idx:
+                p.setPen(self.yellow_pen)
+            elif table.track_location[car_idx] == irsdk.TrkLoc.in_pit_stall or table.track_location[car_idx] == irsdk.TrkLoc.aproaching_pits:
+                p.setPen(self.grey_pen)
             else:
-                color = constants.Color.WHITE
-            pen = QtGui.QPen()
-            pen.setColor(color)
-            p.setPen(pen)
-            p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
+                p.setPen(self.white_pen)
             width = 1280
             xpos = width - 265 + 5
             ypos = 20 + (16 * i) + 5
-            p.drawText(xpos, ypos,30,25, QtCore.Qt.AlignLeft, drivers[i]['position'])
-            p.drawText(xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, '#%d' % (drivers[i]['driver_info']['CarNumber']))
-            p.drawText(xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, drivers[i]['driver_info']['UserName'])
-            p.drawText(xpos + 180, ypos,50,25, QtCore.Qt.AlignRight, drivers[i]['gap'])
-        p.end()
-
-    def sort_by_lap_distance(self, diff):
-        if diff < -.5:
-            return diff + 1
-        elif diff > .5:
-            return diff - 1
-        return diff
-
-    def getFinishedDriverInfo(self):
-        sorted_list = sorted([driver for driver in self.state.drivers.values() if driver['completed_race']], key=lambda d: d['position_info']['Position'])
-        filtered_list = [driver for driver in sorted_list if driver['position_info']['Time'] >= 0]
-        return filtered_list
-
-    def getDriverInfo(self):
-        drivers_by_position = sorted([d for d in self.state.drivers.values() if d['lap_distance'] != -1],
-            reverse=True, key=lambda x: self.sort_by_lap_distance(x['overall_distance']))
-        cur_pos = drivers_by_position.index(self.state.drivers[self.state.cam_car_idx])
-        current_driver = drivers_by_position[cur_pos]
-        metres_per_percent = self.state.track_length * 10
-        driver_positions = []
-        for i in range(0, len(drivers_by_position)):
-            driver = drivers_by_position[i]
-            driver['position'] = str(i + 1)
-            # calc gap to current driver
-            if not driver is current_driver:
-                pct_dif = (driver['overall_distance'] - current_driver['overall_distance']) * 100
-                dist = pct_dif * metres_per_percent
-                gap = dist / (90 / 2.23693629)
-                driver['gap'] = '{:0.01f}'.format(gap)
-            else:
-                driver['gap'] = ''
-            driver_positions.append(driver)
-        return driver_positions
+            resources.drawStaticText(p, xpos, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.position[car_idx], self.font))
+            resources.drawStaticText(p, xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.car_number[car_idx], self.font))
+            resources.drawStaticText(p, xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, resources.staticText(table.user_name[car_idx], self.font))
+            p.drawText(xpos + 180, ypos,50,25, QtCore.Qt.AlignRight, table.gap_text[car_idx])
 
 
 class SetupDrawer:
+    priority = constants.Priority.LOW
+    refresh_rate = 0
+
     def __init__(self, ir, state, setup):
         self.ir = ir
         self.state = state
         self.setup = setup
+        self.font = resources.font('Calibri', 12, QtGui.QFont.Bold)
+        self.white_pen = resources.pen(constants.Color.WHITE)
+        self.grey_pen = resources.pen(constants.Color.GREY)
+        self.setup_text = resources.staticText(setup, self.font)
+        self.layer = layers.StaticLayer(self.paintStatic, (1030, 25, 240, 35))
+
+    def rect(self):
+        return QtCore.QRect(1030, 25, 240, 35)
 
-    def draw(self, widget):
-        self.paintBackground(widget)
-        self.paintText(widget)
+    def fingerprint(self, frame):
+        return ()
 
-    def paintBackground(self, widget):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def draw(self, p, frame):
+        self.layer.draw(p)
+
+    def paintStatic(self, p, key):
+        self.paintBackground(p)
+        self.paintText(p)
+
+    def paintBackground(self, p):
+        p.save()
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.shear(math.radians(-10), 0)
-        p.fillRect(1040 + (30 * math.tan(math.radians(10))), 30, 220, 25, constants.Color.GREY_TRANSPARENT)
-        p.end()
+        p.fillRect(QtCore.QRectF(1040 + (30 * math.tan(math.radians(10))), 30, 220, 25), constants.Color.GREY_TRANSPARENT)
+        p.restore()
 
-    def paintText(self, widget):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def paintText(self, p):
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        pen = QtGui.QPen()
-        pen.setColor(constants.Color.WHITE)
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Calibri', 12, QtGui.QFont.Bold))
-        p.drawText(1042,32,220,25, QtCore.Qt.AlignLeft, self.setup)
-        p.end()
+        p.setPen(self.white_pen)
+        p.setFont(self.font)
+        resources.drawStaticText(p, 1042,32,220,25, QtCore.Qt.AlignLeft, self.setup_text)
 
-    def paintRelativeBackgrounds(self, widget, drivers):
-        for i in range(len(drivers)):
-            if drivers[i]['position_info']['CarIdx'] == self.state.my_car_idx:
+    def paintRelativeBackgrounds(self, p, drivers):
+        p.save()
+        p.setRenderHint(QtGui.QPainter.Antialiasing)
+        p.shear(math.radians(-10), 0)
+        for i, car_idx in enumerate(drivers):
+            if car_idx == self.state.my_car_idx:
                 color = constants.Color.YELLOW
             else:
                 color = constants.Color.GREY_TRANSPARENT
-            p = QtGui.QPainter()
-            p.begin(widget)
-            p.setRenderHint(QtGui.QPainter.Antialiasing)
-            p.shear(math.radians(-10), 0)
-            p.fillRect(1040 + (30 * math.tan(math.radians(10))) * i, 30 + 30 * i, 220, 25, color)
-            p.end()
+            p.fillRect(QtCore.QRectF(1040 + (30 * math.tan(math.radians(10))) * i, 30 + 30 * i, 220, 25), color)
+        p.restore()
 
-    def paintRelativeText(self, widget, drivers):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def paintRelativeText(self, p, drivers):
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        for i in range(len(drivers)):
-            parts = drivers[i]['driver_info']['AbbrevName'].upper().partition(', ')
-            if parts[2] != '':
-                name = '%s %s' % (parts[2][:3], parts[0])
-            else:
-                name = parts[0][:3]
-            name_num = '%s (#%s)' % (parts[0][:3], drivers[i]['driver_info']['CarNumber'])
-            if drivers[i]['position_info']['CarIdx'] == self.state.my_car_idx:
-                color = constants.Color.GREY
+        p.setFont(self.font)
+        table = self.state.drivers
+        for i, car_idx in enumerate(drivers):
+            if car_idx == self.state.my_car_idx:
+                p.setPen(self.grey_pen)
             else:
-                color = constants.Color.WHITE
-            pen = QtGui.QPen()
-            pen.setColor(color)
-            p.setPen(pen)
-            p.setFont(QtGui.QFont('Calibri', 12, QtGui.QFont.Bold))
-            p.drawText(1042,32 + 30 * i,30,25, QtCore.Qt.AlignLeft, drivers[i]['position'])
-            p.drawText(1067,32 + 30 * i,160,25, QtCore.Qt.AlignLeft, name_num)
-            p.drawText(1193,32 + 30 * i,50,25, QtCore.Qt.AlignRight, drivers[i]['gap'])
-        p.end()
-
-    def sort_by_lap_distance(self, diff):
-        if diff < -.5:
-            return diff + 1
-        elif diff > .5:
-            return diff - 1
-        return diff
-
-    def getFinishedDriverInfo(self):
-        return sorted([driver for driver in self.state.drivers.values() if driver['completed_race']], key=lambda d: d['position_info']['Position'])
+                p.setPen(self.white_pen)
+            resources.drawStaticText(p, 1042,32 + 30 * i,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.position[car_idx], self.font))
+            resources.drawStaticText(p, 1067,32 + 30 * i,160,25, QtCore.Qt.AlignLeft, resources.staticText(table.name_number[car_idx], self.font))
+            p.drawText(1193,32 + 30 * i,50,25, QtCore.Qt.AlignRight, table.gap_text[car_idx])
 
     def getDriverInfo(self):
         #todo: Needs to be fixed in case I need to pit
-        drivers_by_position = sorted([d for d in self.state.drivers.values() if d['lap_distance'] != -1 and self.ir['CarIdxTrackSurface'][d['position_info']['CarIdx']] == irsdk.TrkLoc.ON_TRACK],
-            reverse=True, key=lambda x: self.sort_by_lap_distance(x['overall_distance']))
-        cur_pos = drivers_by_position.index(self.state.drivers[self.state.cam_car_idx])
-        range_start = min(max(cur_pos - 2, 0), len(drivers_by_position) - 5)
-        current_driver = drivers_by_position[cur_pos]
-        metres_per_percent = self.state.track_length * 10
-        driver_positions = []
-        for i in range(range_start, range_start + 5):
-            driver = drivers_by_position[i]
-            driver['position'] = str(i + 1)
-            # calc gap to current driver
-            if not driver is current_driver:
-                pct_dif = (driver['overall_distance'] - current_driver['overall_distance']) * 100
-                dist = pct_dif * metres_per_percent
-                gap = dist / (90 / 2.23693629)
-                driver['gap'] = '{:0.01f}'.format(gap)
-            else:
-                driver['gap'] = ''
-            driver_positions.append(driver)
-        return driver_positions
+        return self.state.standings.around(self.state.drivers, self.state.cam_car_idx, 5, irsdk.TrkLoc.on_track)
 
 
 class TachDrawer:
+    priority = constants.Priority.HIGH
+    refresh_rate = 0
 
     def __init__(self, ir, state, speed_units):
         self.ir = ir
@@ -479,73 +522,79 @@ class TachDrawer:
         self.tach_bg_pm.load('images/tach-back.png')
         self.tach_fg_pm = QtGui.QPixmap()
         self.tach_fg_pm.load('images/tach-fore.png')
+        self.background = layers.StaticLayer(lambda p, key: p.drawPixmap(50,50,300,300,self.tach_bg_pm), (50, 50, 300, 300))
+        self.foreground = layers.StaticLayer(lambda p, key: p.drawPixmap(50,50,300,300,self.tach_fg_pm), (50, 50, 300, 300))
+
+        self.speed_font = resources.font('Arial', 54)
+        self.units_font = resources.font('Arial', 15)
+        self.gear_font = resources.font('Arial', 40)
+        self.arc_pen = resources.pen(constants.Color.BLUE, 10, QtCore.Qt.FlatCap)
+        self.units_pen = resources.pen(constants.Color.WHITE_DIM)
+        self.gear_pen = resources.pen(constants.Color.WHITE)
+        self.speed_pens = {}
+
+    def rect(self):
+        return QtCore.QRect(50, 50, 300, 300)
 
-    def draw(self, widget):
-        p = QtGui.QPainter()
-        p.begin(widget)
+    def fingerprint(self, frame):
+        return (round(frame['Throttle'] * 126), round(frame['Brake'] * 126),
+            int(frame['RPM']), round(frame['Speed'] * 3.6, 1), frame['Gear'])
+
+    def draw(self, p, frame):
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         # draw bg
-        p.drawPixmap(50,50,300,300,self.tach_bg_pm)
+        self.background.draw(p)
 
         # draw throttle bar
-        tw = round(self.ir['Throttle'] * 126)
-        p.fillRect(137,260,tw,25,QtGui.QColor(0,255,0,255))
+        tw = round(frame['Throttle'] * 126)
+        p.fillRect(137,260,tw,25,constants.Color.GREEN_SCREEN)
 
         # draw brake bar
-        bw = round(self.ir['Brake'] * 126)
-        p.fillRect(137,292,bw,25,QtGui.QColor(255,0,0,255))
+        bw = round(frame['Brake'] * 126)
+        p.fillRect(137,292,bw,25,constants.Color.PURE_RED)
 
         # draw rpm arc
-        pc = (self.ir['RPM'] - 1000) / 6000
+        pc = (frame['RPM'] - 1000) / 6000
         ra = pc * -270
-        pen = QtGui.QPen()
-        pen.setColor(QtGui.QColor(0,128,255,255))
-        pen.setWidth(10)
-        pen.setCapStyle(QtCore.Qt.FlatCap)
-        p.setPen(pen)
-        p.drawArc(85,83,230,230,(225*16),(ra*16))
+        p.setPen(self.arc_pen)
+        p.drawArc(85,83,230,230,(225*16),int(ra*16))
 
         # draw foreground
-        p.drawPixmap(50,50,300,300,self.tach_fg_pm)
+        self.foreground.draw(p)
 
         # draw speed
-        if self.ir['Speed'] > self.initMaxSpeed:
-            maxSpeed = self.ir['Speed']
+        if frame['Speed'] > self.initMaxSpeed:
+            maxSpeed = frame['Speed']
         else:
             maxSpeed = self.initMaxSpeed
 
         if self.speed_units == 'mph':
             speed_units = 'mph'
             maxSpeed = maxSpeed * 2.236936
-            speed = round(self.ir['Speed'] * 2.236936)
+            speed = round(frame['Speed'] * 2.236936)
         elif self.speed_units == 'kph':
             speed_units = 'km/h'
             maxSpeed = maxSpeed * 3.6
-            speed = round(self.ir['Speed'] * 3.6)
+            speed = round(frame['Speed'] * 3.6)
         else:
             speed_units = 'm/s'
-            speed = round(self.ir['Speed'])
-        pen.setColor(self.colorForPercent(speed/maxSpeed))
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Arial', 54))
-        p.drawText(50,90,300,100, QtCore.Qt.AlignCenter, str(speed))
+            speed = round(frame['Speed'])
+        p.setPen(self.speedPen(speed/maxSpeed))
+        p.setFont(self.speed_font)
+        resources.drawStaticText(p, 50,90,300,100, QtCore.Qt.AlignCenter, resources.staticText(str(speed), self.speed_font))
 
         # draw speed unit
-        pen.setColor(QtGui.QColor(200,200,200,200))
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Arial', 15))
-        p.drawText(50,130,300,100, QtCore.Qt.AlignCenter, speed_units)
+        p.setPen(self.units_pen)
+        p.setFont(self.units_font)
+        resources.drawStaticText(p, 50,130,300,100, QtCore.Qt.AlignCenter, resources.staticText(speed_units, self.units_font))
 
         # draw gear
-        pen.setColor(QtGui.QColor(255,255,255,255))
-        p.setPen(pen)
-        p.setFont(QtGui.QFont('Arial', 40))
-        p.drawText(50,176,300,100, QtCore.Qt.AlignCenter, self.gear())
-
-        p.end()
+        p.setPen(self.gear_pen)
+        p.setFont(self.gear_font)
+        resources.drawStaticText(p, 50,176,300,100, QtCore.Qt.AlignCenter, resources.staticText(self.gear(frame), self.gear_font))
 
-    def gear(self):
-        raw_gear = self.ir['Gear']
+    def gear(self, frame):
+        raw_gear = frame['Gear']
         if raw_gear == -1:
             return 'R'
         elif raw_gear == 0:
@@ -553,92 +602,83 @@ class TachDrawer:
         else:
             return str(raw_gear)
 
+    def speedPen(self, percent):
+        rgb = self.rgbForPercent(percent)
+        pen = self.speed_pens.get(rgb)
+        if pen is None:
+            pen = self.speed_pens[rgb] = resources.pen(QtGui.QColor(*rgb))
+        return pen
+
     def colorForPercent(self, percent):
+        return QtGui.QColor(*self.rgbForPercent(percent))
+
+    def rgbForPercent(self, percent):
         if percent < 0.4:
-            return QtGui.QColor(0,255,0,255)
+            return (0,255,0,255)
         elif percent < 0.6:
             dif = 0.6 - percent
             pc = 1-(dif/0.2)
-            return QtGui.QColor(round(pc * 255),255,0,255)
+            return (round(pc * 255),255,0,255)
         elif percent < 0.8:
-            return QtGui.QColor(255,255,0,255)
+            return (255,255,0,255)
         elif percent < 0.95:
             dif = 0.95 - percent
             pc = (dif/0.15)
-            return QtGui.QColor(255,round(pc * 255),0,255)
+            return (255,round(pc * 255),0,255)
         else:
-            return QtGui.QColor(255,0,0,255)
+            return (255,0,0,255)
 
 class FileDrawer:
-    def __init__(self, ir, state):
+    priority = constants.Priority.LOW
+    refresh_rate = 1
+
+    def __init__(self, ir, state, cfg):
         self.ir = ir
         self.state = state
         self.show_results = False
+        self.writer = ImageWriter(cfg.get('file_path', 'myimage.png'), cfg.get('file_format', 'png'),
+            float(cfg.get('file_rate', 10)))
+        self.font = resources.font('Calibri', 10, QtGui.QFont.Bold)
+        self.yellow_pen, self.grey_pen, self.white_pen = rowPens()
 
-    def draw(self, widget):
-        random.seed()
-        if not random.randint(0, 100):
-            return
-        drivers = self.getDriverInfo()
+    def rect(self):
+        # not painted on the overlay, drawn from OverlayWindow.refresh()
+        return QtCore.QRect()
+
+    def fingerprint(self, frame):
+        return (self.state.standings.version, self.state.my_car_idx)
+
+    def close(self):
+        self.writer.close()
+
+    def draw(self, p, frame):
+        drivers = self.state.standings.running
         width = 250
         xpos = 0
         ypos = 0
         height = len(drivers) * 16 + 10
-        img = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+        img = self.writer.acquire(width, height)
+        if img is None:
+            # writer still busy with earlier frames, the next change catches up
+            return
         p = QtGui.QPainter(img)
         p.setRenderHint(QtGui.QPainter.Antialiasing)
         p.fillRect(xpos, ypos, 250, height, constants.Color.GREY_TRANSPARENT)
         p.setRenderHint(QtGui.QPainter.TextAntialiasing)
-        for i in range(len(drivers)):
-            if drivers[i]['position_info']['CarIdx'] == self.state.my_car_idx:
-                color = constants.Color.YELLOW
-            elif  drivers[i]['track_location'] == irsdk.TrkLoc.IN_PIT_STALL or drivers[i]['track_location'] == irsdk.TrkLoc.APROACHING_PITS:
-                color = constants.Color.LIGHT_GREY
+        p.setFont(self.font)
+        table = self.state.drivers
+        for i, car_idx in enumerate(drivers):
+            if car_idx == self.state.my_car_idx:
+                p.setPen(self.yellow_pen)
+            elif table.track_location[car_idx] == irsdk.TrkLoc.in_pit_stall or table.track_location[car_idx] == irsdk.TrkLoc.aproaching_pits:
+                p.setPen(self.grey_pen)
             else:
-                color = constants.Color.WHITE
-            pen = QtGui.QPen()
-            pen.setColor(color)
-            p.setPen(pen)
-            p.setFont(QtGui.QFont('Calibri', 10, QtGui.QFont.Bold))
+                p.setPen(self.white_pen)
             xpos = 8
             ypos = (16 * i) + 5
-            p.drawText(xpos, ypos,30,25, QtCore.Qt.AlignLeft, drivers[i]['position'])
-            p.drawText(xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, '#%d' % (drivers[i]['driver_info']['CarNumber']))
-            p.drawText(xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, drivers[i]['driver_info']['UserName'])
-            p.drawText(xpos + 180, ypos,50,25, QtCore.Qt.AlignRight, drivers[i]['gap'])
-        img.save("myimage.png", "PNG")
-        del p
-
-    def sort_by_lap_distance(self, diff):
-        if diff < -.5:
-            return diff + 1
-        elif diff > .5:
-            return diff - 1
-        return diff
-
-    def getFinishedDriverInfo(self):
-        sorted_list = sorted([driver for driver in self.state.drivers.values() if driver['completed_race']], key=lambda d: d['position_info']['Position'])
-        filtered_list = [driver for driver in sorted_list if driver['position_info']['Time'] >= 0]
-        return filtered_list
-
-    def getDriverInfo(self):
-        drivers_by_position = sorted([d for d in self.state.drivers.values() if d['lap_distance'] != -1],
-            reverse=True, key=lambda x: self.sort_by_lap_distance(x['overall_distance']))
-        cur_pos = drivers_by_position.index(self.state.drivers[self.state.cam_car_idx])
-        current_driver = drivers_by_position[cur_pos]
-        metres_per_percent = self.state.track_length * 10
-        driver_positions = []
-        for i in range(0, len(drivers_by_position)):
-            driver = drivers_by_position[i]
-            driver['position'] = str(i + 1)
-            # calc gap to current driver
-            if not driver is current_driver:
-                pct_dif = (driver['overall_distance'] - current_driver['overall_distance']) * 100
-                dist = pct_dif * metres_per_percent
-                gap = dist / (90 / 2.23693629)
-                driver['gap'] = '{:0.01f}'.format(gap)
-            else:
-                driver['gap'] = ''
-            driver_positions.append(driver)
-        return driver_positions
-
+            resources.drawStaticText(p, xpos, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.position[car_idx], self.font))
+            resources.drawStaticText(p, xpos + 20, ypos,30,25, QtCore.Qt.AlignLeft, resources.staticText(table.car_number[car_idx], self.font))
+            resources.drawStaticText(p, xpos + 55, ypos,160,25, QtCore.Qt.AlignLeft, resources.staticText(table.user_name[car_idx], self.font))
+            p.drawText(xpos + 180, ypos,50,25, QtCore.Qt.AlignRight, table.gap_text[car_idx])
+        p.end()
+        self.writer.submit(img)
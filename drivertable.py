@@ -0,0 +1,88 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from telemetry import CAR_COUNT
+
+LICENSE_CLASSES = ['R', 'D', 'C', 'B', 'A', 'P', 'WC']
+
+
+class DriverTable:
+    # every driver of the session as columns indexed by CarIdx, numbers in
+    # arrays so per tick updates and sorts are vectorised, the strings the
+    # overlay draws built once when a driver's session info changes
+
+    def __init__(self, car_count=CAR_COUNT):
+        self.car_count = car_count
+        self.present = np.zeros(car_count, dtype=bool)
+
+        # telemetry, nan overall distance until the car is first seen on track
+        self.overall_distance = np.full(car_count, np.nan)
+        self.lap_distance = np.full(car_count, -1.0)
+        self.track_location = np.full(car_count, -1, dtype=np.int32)
+        self.lap = np.ones(car_count, dtype=np.int32)
+        self.crossed_start_line = np.zeros(car_count, dtype=bool)
+        self.completed_race = np.zeros(car_count, dtype=bool)
+        self.gap = np.full(car_count, np.nan)
+
+        # session results, has_result is False until the car is listed
+        self.has_result = np.zeros(car_count, dtype=bool)
+        self.result_position = np.zeros(car_count, dtype=np.int32)
+        self.result_lap = np.zeros(car_count, dtype=np.int32)
+        self.result_time = np.full(car_count, np.nan)
+        self.fastest_time = np.full(car_count, np.nan)
+        self.class_position = np.zeros(car_count, dtype=np.int32)
+        self.qual_position = np.full(car_count, -1, dtype=np.int32)
+
+        # display strings
+        self.user_name = [''] * car_count
+        self.car_number = [''] * car_count
+        self.name_number = [''] * car_count
+        self.license_class = [''] * car_count
+        self.safety_rating = [''] * car_count
+        self.position = [''] * car_count
+        self.gap_text = [''] * car_count
+        self._info = [None] * car_count
+        self._result = [None] * car_count
+
+    def __contains__(self, car_idx):
+        return 0 <= car_idx < self.car_count and self.present[car_idx]
+
+    def cars(self):
+        return np.flatnonzero(self.present)
+
+    def setDriver(self, d):
+        # an entry of DriverInfo Drivers
+        car_idx = d['CarIdx']
+        info = (d['UserName'], d['AbbrevName'], d['CarNumber'], d['LicLevel'], d['LicSubLevel'])
+        if not self.present[car_idx]:
+            self.present[car_idx] = True
+        elif info == self._info[car_idx]:
+            return
+        self._info[car_idx] = info
+        self.user_name[car_idx] = d['UserName']
+        self.car_number[car_idx] = '#%s' % d['CarNumber']
+        parts = d['AbbrevName'].upper().partition(', ')
+        self.name_number[car_idx] = '%s (#%s)' % (parts[0][:3], d['CarNumber'])
+        self.license_class[car_idx] = LICENSE_CLASSES[int(d['LicLevel'] / 5)]
+        self.safety_rating[car_idx] = '{:.2f}'.format(d['LicSubLevel'] / 100)
+
+    def setResult(self, pos):
+        # an entry of SessionInfo ResultsPositions
+        car_idx = pos['CarIdx']
+        result = (pos['Position'], pos['Lap'], pos['Time'], pos['FastestTime'], pos['ClassPosition'])
+        if not self.present[car_idx] or result == self._result[car_idx]:
+            return
+        self._result[car_idx] = result
+        self.has_result[car_idx] = True
+        self.result_position[car_idx] = pos['Position']
+        self.result_lap[car_idx] = pos['Lap']
+        self.result_time[car_idx] = pos['Time']
+        self.fastest_time[car_idx] = pos['FastestTime']
+        self.class_position[car_idx] = pos['ClassPosition'] + 1
+
+    def setQualifying(self, pos):
+        # an entry of QualifyResultsInfo Results
+        car_idx = pos['CarIdx']
+        if self.present[car_idx]:
+            self.qual_position[car_idx] = pos['Position']
@@ -0,0 +1,98 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from telemetry import CAR_COUNT, forward_moves, crossing_times
+
+CHECKPOINTS = 200
+
+
+class Intervals:
+    # session time at which every car last crossed each point of a fixed grid
+    # of lap distance checkpoints, one ring per car over the lap
+
+    def __init__(self, checkpoints=CHECKPOINTS, car_count=CAR_COUNT):
+        self.checkpoints = checkpoints
+        self.times = np.full((car_count, checkpoints), np.nan)
+        self.lap_times = np.full(car_count, np.nan)
+        self.last_checkpoint = np.full(car_count, -1, dtype=np.int32)
+        self.last_pct = np.full(car_count, -1.0)
+        self.last_time = -1
+        self._cars = np.arange(car_count)
+
+    def reset(self):
+        self.times.fill(np.nan)
+        self.lap_times.fill(np.nan)
+        self.last_checkpoint.fill(-1)
+        self.last_pct.fill(-1)
+        self.last_time = -1
+
+    def update(self, session_time, pcts):
+        if session_time < self.last_time:
+            self.reset()
+
+        pcts = np.asarray(pcts, dtype=np.float64)
+        valid = pcts >= 0
+        checkpoint = np.where(valid, np.minimum((pcts * self.checkpoints).astype(np.int32), self.checkpoints - 1), -1)
+
+        travelled, moving = forward_moves(self.last_pct, pcts)
+        crossed = moving & (checkpoint != self.last_checkpoint)
+
+        if crossed.any() and self.last_time >= 0:
+            # every checkpoint passed since the last tick, a car can cover
+            # several in one when ticks are dropped or the replay runs fast
+            cars = self._cars[crossed]
+            steps = (checkpoint[crossed] - self.last_checkpoint[crossed]) % self.checkpoints
+            if steps.max() == 1:
+                cp = checkpoint[crossed]
+                last = slice(None)
+            else:
+                ends = np.cumsum(steps)
+                cars = np.repeat(cars, steps)
+                cp = (self.last_checkpoint[cars] + 1 + np.arange(len(cars)) - np.repeat(ends - steps, steps)) % self.checkpoints
+                last = ends - 1
+            # when the car passed the start of each of them
+            ahead = (cp / self.checkpoints - self.last_pct[cars]) % 1
+            t = crossing_times(self.last_time, session_time, ahead, travelled[cars])
+            # lap time from the checkpoint each car is in now, the last of its run
+            self.lap_times[cars[last]] = t[last] - self.times[cars[last], cp[last]]
+            self.times[cars, cp] = t
+
+        self.last_checkpoint = checkpoint
+        self.last_pct = np.where(valid, pcts, -1)
+        self.last_time = session_time
+
+    def gap(self, car_idx, other_idx, distance):
+        # seconds other_idx is ahead of car_idx (negative when behind),
+        # distance is how far other_idx is ahead in laps
+        if distance >= 0:
+            behind, ahead, sign = car_idx, other_idx, 1
+        else:
+            behind, ahead, sign = other_idx, car_idx, -1
+        k = self.last_checkpoint[behind]
+        if k < 0:
+            return np.nan
+        gap = self.times[behind, k] - self.times[ahead, k]
+        if gap < 0:
+            gap += self.lap_times[behind]
+        # whole laps need a lap time, a gap on the same lap does not
+        laps = int(abs(distance))
+        if laps > 0:
+            gap += laps * self.lap_times[behind]
+        return sign * gap
+
+    def gaps_to(self, car_idx, distances):
+        # gap() against car_idx for every slot at once
+        distances = np.asarray(distances, dtype=np.float64)
+        laps = np.abs(distances).astype(np.int32)
+        k = self.last_checkpoint[car_idx]
+        if k < 0:
+            return np.full(distances.shape, np.nan)
+        ahead = self.times[car_idx, k] - self.times[:, k]
+        ahead = np.where(ahead < 0, ahead + self.lap_times[car_idx], ahead)
+        ahead += np.where(laps > 0, laps * self.lap_times[car_idx], 0)
+        own = np.maximum(self.last_checkpoint, 0)
+        behind = self.times[self._cars, own] - self.times[car_idx, own]
+        behind = np.where(behind < 0, behind + self.lap_times, behind)
+        behind = np.where(self.last_checkpoint >= 0, -(behind + np.where(laps > 0, laps * self.lap_times, 0)), np.nan)
+        return np.where(distances >= 0, ahead, behind)
@@ -0,0 +1,79 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+from PyQt5 import QtGui, QtCore
+
+
+class StaticLayer:
+    # the parts of a drawer that never change, rendered once into a
+    # premultiplied pixmap and blitted each frame; re-rendered when the
+    # window is resized or the key passed to draw() changes
+
+    def __init__(self, paint, rect=None):
+        self.paint = paint
+        self.rect = QtCore.QRect(*rect) if rect is not None else None
+        self.pixmap = None
+        self.key = None
+
+    def draw(self, p, key=None):
+        device = p.device()
+        ratio = device.devicePixelRatioF()
+        cache_key = (device.width(), device.height(), ratio, key)
+        rect = self.rect if self.rect is not None else QtCore.QRect(0, 0, device.width(), device.height())
+        if self.pixmap is None or cache_key != self.key:
+            self.key = cache_key
+            self.pixmap = self.render(rect, ratio, key)
+        p.drawPixmap(rect.topLeft(), self.pixmap)
+
+    def render(self, rect, ratio, key):
+        img = QtGui.QImage(round(rect.width() * ratio), round(rect.height() * ratio), QtGui.QImage.Format_ARGB32_Premultiplied)
+        img.setDevicePixelRatio(ratio)
+        img.fill(QtCore.Qt.transparent)
+        lp = QtGui.QPainter(img)
+        lp.translate(-rect.left(), -rect.top())
+        self.paint(lp, key)
+        lp.end()
+        return QtGui.QPixmap.fromImage(img)
+
+    def invalidate(self):
+        self.pixmap = None
+
+
+class DraftPainter(QtGui.QPainter):
+    # ignores the antialiasing drawers ask for, used for cheaper output while
+    # the overlay is over its frame budget
+    DROPPED = (QtGui.QPainter.Antialiasing, QtGui.QPainter.TextAntialiasing, QtGui.QPainter.HighQualityAntialiasing)
+
+    def __init__(self, device):
+        super(DraftPainter, self).__init__(device)
+        super(DraftPainter, self).setRenderHint(QtGui.QPainter.TextAntialiasing, False)
+
+    def setRenderHint(self, hint, on=True):
+        if on and hint in self.DROPPED:
+            return
+        super(DraftPainter, self).setRenderHint(hint, on)
+
+
+class DrawerLayer:
+    # the last output of a low priority drawer, re-rendered when the overlay
+    # asks and otherwise blitted as is
+
+    def __init__(self, drawer):
+        self.drawer = drawer
+        self.rect = None
+        self.pixmap = None
+
+    def render(self, frame, rect, ratio, draft=False):
+        img = QtGui.QImage(round(rect.width() * ratio), round(rect.height() * ratio), QtGui.QImage.Format_ARGB32_Premultiplied)
+        img.setDevicePixelRatio(ratio)
+        img.fill(QtCore.Qt.transparent)
+        lp = DraftPainter(img) if draft else QtGui.QPainter(img)
+        lp.translate(-rect.left(), -rect.top())
+        self.drawer.draw(lp, frame)
+        lp.end()
+        self.rect = QtCore.QRect(rect)
+        self.pixmap = QtGui.QPixmap.fromImage(img)
+
+    def draw(self, p):
+        if self.pixmap is not None:
+            p.drawPixmap(self.rect.topLeft(), self.pixmap)
@@ -6,8 +6,21 @@ import sys
 import shutil
 import re
 from state import State
+from standings import Standings
+from drivertable import DriverTable
+from intervals import Intervals
+from speeds import Speeds
+from timing import LapTiming
+from reference import ReferenceLap
+from telemetry import read_frame
+from sessioninfo import SessionInfo
+from scheduler import FrameScheduler, TelemetryPoller, TICK_RATE
+from recording import Recorder
+from replay import ReplayIRSDK
+from profiler import profiler
 import time
 import math
+import numpy as np
 import logging, logging.handlers
 import argparse
 import json
@@ -21,68 +34,90 @@ import configobj
 
 VERSION = '1.1.0'
 
-LICENSE_CLASSES = ['R', 'D', 'C', 'B', 'A', 'P', 'WC']
+recorder = None
+session_info = None
+reference_path = None
 
 
 def on_session_change():
-    if ir['DriverInfo']:
-        state.my_car_idx = ir['DriverInfo']['DriverCarIdx']
-        state.rpm_min = ir['DriverInfo']['DriverCarSLFirstRPM'] * 2/3
-        state.rpm_max = ir['DriverInfo']['DriverCarRedLine']
+    # a new session starts every table over
+    state.drivers = DriverTable()
+    state.standings = Standings()
+    state.intervals = Intervals()
+    state.speeds = Speeds()
+    state.timing = LapTiming()
+    state.reference = ReferenceLap(reference_path)
+    state.last_time_update_drivers = -1
+    state.drivers_info_update = -1
+    on_session_info_change()
+    on_cam_change()
+
+def on_session_info_change():
+    # the session's values from its info, read again while some are still
+    # missing; the tables keep what they have timed so far
+    if session_info['DriverInfo']:
+        state.my_car_idx = session_info['DriverInfo']['DriverCarIdx']
+        state.rpm_min = session_info['DriverInfo']['DriverCarSLFirstRPM'] * 2/3
+        state.rpm_max = session_info['DriverInfo']['DriverCarRedLine']
     else:
         state.my_car_idx = state.rpm_min = state.rpm_max = -1
 
-    if ir['WeekendInfo']:
-        state.track_length = float(ir['WeekendInfo']['TrackLength'].split()[0])
+    if session_info['WeekendInfo']:
+        state.track_length = float(session_info['WeekendInfo']['TrackLength'].split()[0])
     else:
         state.track_length = -1
 
-    if ir['SessionInfo']:
-        state.session_laps = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionLaps']
-        session_time = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionTime']
+    if session_info['SessionInfo']:
+        state.session_laps = session_info['SessionInfo']['Sessions'][state.last_session_num]['SessionLaps']
+        session_time = session_info['SessionInfo']['Sessions'][state.last_session_num]['SessionTime']
         state.session_time = -1 if session_time == 'unlimited' else float(session_time.split()[0])
-        state.cur_session_type = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionType']
+        state.cur_session_type = session_info['SessionInfo']['Sessions'][state.last_session_num]['SessionType']
     else:
         state.session_laps = state.session_time = -1
         state.cur_session_type = None
 
-    if ir['WeekendInfo'] and ir['DriverInfo']:
-        state.event_type = ir['WeekendInfo']['EventType']
+    if session_info['WeekendInfo'] and session_info['DriverInfo']:
+        state.event_type = session_info['WeekendInfo']['EventType']
     else:
         state.event_type = None
 
-    if ir['SplitTimeInfo']:
-        state.first_sector_pct = ir['SplitTimeInfo']['Sectors'][1]['SectorStartPct']
+    if session_info['CameraInfo']:
+        state.camera_groups = [g['GroupName'] for g in session_info['CameraInfo']['Groups']]
+    else:
+        state.camera_groups = []
+
+    if session_info['SplitTimeInfo']:
+        sector_starts = [s['SectorStartPct'] for s in session_info['SplitTimeInfo']['Sectors']]
+        state.first_sector_pct = sector_starts[1] if len(sector_starts) > 1 else -1
     else:
+        sector_starts = [0.0]
         state.first_sector_pct = -1
 
-    state.drivers = {}
-    state.last_time_update_drivers = -1
-    on_cam_change()
+    state.session_info_update = session_info.update
+    state.timing.setSectors(sector_starts)
 
 def on_cam_change():
-    print(ir['CamCameraNumber'])
+    print(state.frame['CamCameraNumber'])
     state.last_time_update_lap_ses_time = -1
     state.last_time_update_positions = -1
     state.last_time_update_standing = -1
     state.cur_dist_pct = 0
     state.last_dist_pct = 0
-    state.speed_calc_data = []
 
-def update_speed_rpm():
-    if ir['CarIdxTrackSurface'][state.cam_car_idx] == irsdk.TrkLoc.not_in_world \
-        or (ir['IsReplayPlaying'] and ir['ReplayFrameNumEnd'] > 10):
+def update_speed_rpm(frame):
+    if frame['CarIdxTrackSurface'][state.cam_car_idx] == irsdk.TrkLoc.not_in_world \
+        or (frame['IsReplayPlaying'] and frame['ReplayFrameNumEnd'] > 10):
         return
 
     if state.my_car_idx == state.cam_car_idx:
-        speed = ir['Speed']
-        rpm = ir['RPM']
-        gear = ir['Gear']
-        fuel = ir['FuelLevel']
+        speed = frame['Speed']
+        rpm = frame['RPM']
+        gear = frame['Gear']
+        fuel = frame['FuelLevel']
     else:
         speed = None
-        rpm = ir['CarIdxRPM'][state.cam_car_idx]
-        gear = ir['CarIdxGear'][state.cam_car_idx]
+        rpm = frame['CarIdxRPM'][state.cam_car_idx]
+        gear = frame['CarIdxGear'][state.cam_car_idx]
         fuel = None
 
     if not rpm is None:
@@ -104,15 +139,7 @@ def update_speed_rpm():
         gear = 'R' if gear == -1 else 'N' if gear == 0 else gear
 
     if speed is None:
-        speed = 0
-        if len(state.speed_calc_data) > 1:
-            diff_pct = state.speed_calc_data[-1][0] - state.speed_calc_data[0][0]
-            if diff_pct < 0: diff_pct += 1
-            diff_time = max(0, state.speed_calc_data[-1][1] - state.speed_calc_data[0][1])
-            if diff_pct > 0 and diff_time > 0:
-                speed = max(0, state.track_length * diff_pct / diff_time * 1000)
-                if speed > 110:
-                    speed = 0
+        speed = state.speeds.speeds(state.track_length)[state.cam_car_idx]
     if cfg['speed_units'] == 'mps':                 # meters per second
         speed = '{:2.0f} m/s'.format(speed)
     elif cfg['speed_units'] == 'mph':               # miles per hour
@@ -125,15 +152,15 @@ def update_speed_rpm():
     result ='{}{}{}  {}'.format(speed, rpm, gear, fuel)
     logging.debug(result)
 
-def update_lap_ses_time():
+def update_lap_ses_time(frame):
     if state.last_time_update_lap_ses_time > 0 and state.cur_session_time - state.last_time_update_lap_ses_time < .5:
         return
     state.last_time_update_lap_ses_time = state.cur_session_time
 
-    lap_num =  ir['CarIdxLap'][state.cam_car_idx]
+    lap_num =  frame['CarIdxLap'][state.cam_car_idx]
     session_time = 0
 
-    if lap_num is 0:
+    if lap_num == 0:
         state.pre_session_time = state.cur_session_time or 0
     else:
         session_time = state.cur_session_time - state.pre_session_time
@@ -146,7 +173,7 @@ def update_lap_ses_time():
 #     else:
 #         lap_num =  ir['CarIdxLap'][state.cam_car_idx]
 
-    lap_num =  ir['CarIdxLap'][state.cam_car_idx]
+    lap_num =  frame['CarIdxLap'][state.cam_car_idx]
 
     if not session_time is None:
         m, s = divmod(int(session_time), 60)
@@ -175,82 +202,82 @@ def update_drivers():
         return
     state.last_time_update_drivers = state.cur_session_time
 
-    if ir['DriverInfo']:
-        for d in ir['DriverInfo']['Drivers']:
-            if d['IsSpectator'] or d['UserID'] == -1: continue
-            car_idx = d['CarIdx']
-            if not car_idx in state.drivers:
-                state.drivers[car_idx] = dict(
-                    license_class = LICENSE_CLASSES[int(d['LicLevel'] / 5)],
-                    safety_rating = '{:.2f}'.format(d['LicSubLevel'] / 100),
-                    class_position = 0,
-                    completed_race = False,
-                    lap = 1)
-            state.drivers[car_idx]['driver_info'] = d
-
-    if ir['SessionInfo']:
-        state.results_positions = ir['SessionInfo']['Sessions'][state.last_session_num]['ResultsPositions']
-        if state.results_positions:
-            if state.event_type == 'Race':
-                state.race_time = ir['SessionInfo']['Sessions'][state.last_session_num]['ResultsAverageLapTime'] * state.session_laps
-                state.drivers_on_lead_lap = len([p for p in state.results_positions if p['Lap'] == 0])
-            for pos in state.results_positions:
-                car_idx = pos['CarIdx']
-                if car_idx in state.drivers:
-                    state.drivers[car_idx]['position_info'] = pos
-                    state.drivers[car_idx]['class_position'] = pos['ClassPosition'] + 1
-
-    if ir['QualifyResultsInfo']:
-        qual_positions = ir['QualifyResultsInfo']['Results']
-        if qual_positions:
-            for pos in qual_positions:
-                car_idx = pos['CarIdx']
-                if car_idx in state.drivers:
-                    state.drivers[car_idx]['qual_info'] = pos
-
-
-def sort_by_lap_distance(diff):
-    if diff < -.5:
-        return diff + 1
-    elif diff > .5:
-        return diff - 1
-    return diff
-
-def update_position():
+    # driver and results entries only change with the session info, and then
+    # only the ones that differ from last time are applied
+    if state.drivers_info_update != session_info.refresh():
+        state.drivers_info_update = session_info.update
+
+        if session_info['DriverInfo']:
+            for d in session_info['DriverInfo']['Drivers']:
+                if d['IsSpectator'] or d['UserID'] == -1: continue
+                state.drivers.setDriver(d)
+
+        if session_info['SessionInfo']:
+            state.results_positions = session_info['SessionInfo']['Sessions'][state.last_session_num]['ResultsPositions']
+            if state.results_positions:
+                if state.event_type == 'Race':
+                    state.race_time = session_info['SessionInfo']['Sessions'][state.last_session_num]['ResultsAverageLapTime'] * state.session_laps
+                    state.drivers_on_lead_lap = len([p for p in state.results_positions if p['Lap'] == 0])
+                for pos in state.results_positions:
+                    state.drivers.setResult(pos)
+
+        if session_info['QualifyResultsInfo']:
+            qual_positions = session_info['QualifyResultsInfo']['Results']
+            if qual_positions:
+                for pos in qual_positions:
+                    state.drivers.setQualifying(pos)
+
+    state.standings.update_finished(state.drivers, state.drivers_on_lead_lap)
+
+def update_position(frame):
     if state.last_time_update_positions > 0 and state.cur_session_time - state.last_time_update_positions < 1:
         return
     state.last_time_update_positions = state.cur_session_time
 
 #     if state.cam_car_idx in state.drivers and ir['CarIdxTrackSurface'][state.cam_car_idx] != -1:
-    for car_idx, (lap, pct, trk_loc) in enumerate(zip(ir['CarIdxLap'], ir['CarIdxLapDistPct'], ir['CarIdxTrackSurface'])):
-        if not car_idx in state.drivers: continue
-        d = state.drivers[car_idx]
-        if lap == 1 and not 'has_crossed_start_line' in d:
-            if pct < 0.5:
-                d['has_crossed_start_line'] = True
-            else:
-                lap = 0
-        if trk_loc == irsdk.TrkLoc.on_track or trk_loc == irsdk.TrkLoc.off_track: # only update overall distance if not pitting
-            d['overall_distance'] = lap + pct
-        d['lap_distance'] = pct
-        d['track_location'] = trk_loc
-
-        # driver has crossed finish line
-        if state.event_type == 'Race' and d['lap'] != lap:
-            # first driver finishes race
-            if not state.has_race_been_won and lap > state.session_laps:
-                d['completed_race'] = True
+    drivers = state.drivers
+    cars = drivers.present
+    laps = frame['CarIdxLap'].astype(np.int32)
+    pcts = frame['CarIdxLapDistPct']
+    trk_locs = frame['CarIdxTrackSurface']
+
+    # still on the lap of the start until the line is crossed
+    first_lap = cars & (laps == 1) & ~drivers.crossed_start_line
+    drivers.crossed_start_line |= first_lap & (pcts < 0.5)
+    laps[first_lap & (pcts >= 0.5)] = 0
+
+    # only update overall distance if not pitting
+    on_track = cars & ((trk_locs == irsdk.TrkLoc.on_track) | (trk_locs == irsdk.TrkLoc.off_track))
+    np.copyto(drivers.overall_distance, laps + pcts, where=on_track)
+    np.copyto(drivers.lap_distance, pcts, where=cars)
+    np.copyto(drivers.track_location, trk_locs, where=cars)
+
+    # drivers that have crossed the finish line
+    if state.event_type == 'Race':
+        crossed = np.flatnonzero(cars & (drivers.lap != laps))
+        if not state.has_race_been_won:
+            # first driver finishes race, the ones before it in car order
+            # still counted their lap
+            winners = crossed[laps[crossed] > state.session_laps]
+            if len(winners):
                 state.has_race_been_won = True
-            elif state.has_race_been_won:
-                if not d['completed_race']:
-                    d['completed_race'] = True
+                before = crossed[crossed < winners[0]]
+                drivers.lap[before] = laps[before]
+                drivers.completed_race[crossed[crossed >= winners[0]]] = True
             else:
-                d['lap'] = lap
+                drivers.lap[crossed] = laps[crossed]
+        else:
+            drivers.completed_race[crossed] = True
 
+    state.standings.update_running(state.drivers, state.cam_car_idx, state.track_length, state.intervals)
+    state.standings.update_finished(state.drivers, state.drivers_on_lead_lap)
 
 
 def main():
-    global state
+    global state, session_info
+
+    if session_info is None or session_info.ir is not ir:
+        session_info = SessionInfo(ir)
 
     if state.is_connected and (not ir.is_initialized or not ir.is_connected):
         state.is_connected = False
@@ -262,33 +289,43 @@ def main():
         logging.info('IRSDK connected')
 
     if not state.is_connected:
-#         time.sleep(2)
-        controlsWindow.overlayWindow.update()
-        return
+        return None
 
-    state.cur_session_time = ir['SessionTime']
-    if state.cur_session_state_time == -1 and ir['CarIdxLap'][1] == 1:
+    frame = profiler.call('stage.read_frame', read_frame, ir)
+    state.frame = frame
+    profiler.stampTick(frame['SessionTick'])
+    if recorder is not None:
+        recorder.add(ir, frame)
+
+    state.cur_session_time = frame['SessionTime']
+    if state.cur_session_state_time == -1 and frame['CarIdxLap'][1] == 1:
         state.cur_session_state_time = state.cur_session_time
 
-    # session changed
-    if state.last_session_num != ir['SessionNum'] or \
-        state.last_session_state != ir['SessionState'] or \
-        state.rpm_min == -1 or state.rpm_max == -1 or \
+    # session changed, or the session info it was missing has changed since
+    incomplete = state.rpm_min == -1 or state.rpm_max == -1 or \
         state.track_length == -1 or \
         state.first_sector_pct == -1 or \
-        not state.cur_session_type:
+        not state.cur_session_type
+    new_session = state.last_session_num != frame['SessionNum'] or \
+        state.last_session_state != frame['SessionState']
+    if new_session or (incomplete and state.session_info_update != session_info.refresh()):
 
-        state.last_session_num = ir['SessionNum']
-        state.last_session_state = ir['SessionState']
+        state.last_session_num = frame['SessionNum']
+        state.last_session_state = frame['SessionState']
         try:
-            on_session_change()
+            if new_session:
+                profiler.call('stage.session_change', on_session_change)
+            else:
+                profiler.call('stage.session_info_change', on_session_info_change)
         except:
-            state.last_session_num = -1
+            # a failed info change is tried again on the next update
+            if new_session:
+                state.last_session_num = -1
             logging.exception('error in on session change')
 
     # cam changed
-    if state.cam_car_idx != ir['CamCarIdx']:
-        state.cam_car_idx = ir['CamCarIdx']
+    if state.cam_car_idx != frame['CamCarIdx']:
+        state.cam_car_idx = frame['CamCarIdx']
         try:
             on_cam_change()
         except:
@@ -296,16 +333,51 @@ def main():
             logging.exception('error in on cam change')
 
     state.last_dist_pct = state.cur_dist_pct
-    state.cur_dist_pct = ir['CarIdxLapDistPct'][state.cam_car_idx]
-    state.speed_calc_data.append((state.cur_dist_pct, state.cur_session_time))
-    state.speed_calc_data = state.speed_calc_data[-10:]
-
-    update_speed_rpm()
-    update_lap_ses_time()
-    update_drivers()
-    update_position()
-
-    controlsWindow.overlayWindow.update()
+    state.cur_dist_pct = frame['CarIdxLapDistPct'][state.cam_car_idx]
+    profiler.call('stage.speeds', state.speeds.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+    profiler.call('stage.intervals', state.intervals.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+    profiler.call('stage.timing', state.timing.update, state.cur_session_time, frame['CarIdxLapDistPct'])
+    profiler.call('stage.reference', state.reference.update, state.cam_car_idx, state.cur_session_time,
+        frame['CarIdxLapDistPct'][state.cam_car_idx], state.timing)
+
+    profiler.call('stage.speed_rpm', update_speed_rpm, frame)
+    profiler.call('stage.lap_ses_time', update_lap_ses_time, frame)
+    profiler.call('stage.drivers', update_drivers)
+    profiler.call('stage.position', update_position, frame)
+
+    if recorder is not None:
+        profiler.call('stage.keyframe', recorder.keyframe, state)
+
+    return frame
+
+def snapshot(frame):
+    # a copy of the state after this tick for the GUI thread, the update
+    # loop carries on with its own; the frame is already a frozen copy
+    if frame is None:
+        return None, None
+    copy = state.snapshot()
+    copy.frame = frame
+    return copy, profiler.stamp
+
+def seek(session_time):
+    # jump a replay to session_time, restoring the last keyframe before it
+    # and running the ticks in between without painting
+    tick = ir.recording.tickAt(session_time)
+    key_tick, saved = ir.recording.keyframe(tick)
+    state.restore(saved if saved is not None else State())
+    ir.step(range(key_tick + 1, tick + 1), main)
+
+def default_config():
+    config = configobj.ConfigObj(encoding="UTF8")
+    config['speed_units'] = 'kph'
+    config['rpm_speed'] = {}
+    config['rpm_speed']['blocks'] = [' ', '\u258c', '\u2588']
+    config['rpm_speed']['vertical_line'] = '\u2502'
+    config['overlay_fps'] = 60
+    config['file_path'] = 'myimage.png'
+    config['file_format'] = 'png'
+    config['file_rate'] = 10
+    return config
 
 def patch_irsdk():
     def get_hwnd(self):
@@ -344,7 +416,14 @@ if __name__ == '__main__':
     parser.add_argument('-V', '--version', action='version', version='iRacing Hotlap Overlay %s' % VERSION, help='show version and exit')
     parser.add_argument('--test', help='use test file as irsdk mmap')
     parser.add_argument('--dump', help='dump irsdk mmap to file')
+    parser.add_argument('--record', help='record every tick of the session to file')
+    parser.add_argument('--replay', help='play a recorded session instead of the sim')
+    parser.add_argument('--speed', help='replay speed, 0 for as fast as possible', type=float, default=1)
+    parser.add_argument('--seek', help='start the replay at this session time', type=float)
     parser.add_argument('--configfile', help='config file', default='config.ini')
+    parser.add_argument('--fps', help='overlay repaint rate', type=int)
+    parser.add_argument('--reference', help='reference lap file for the delta, loaded if it exists and saved on every faster lap')
+    parser.add_argument('--profile', help='time every update stage and drawer, written to file on exit')
     args = parser.parse_args()
 
     logging_handlers = [logging.handlers.RotatingFileHandler('log', maxBytes=1 * 1024 * 1024, encoding='utf-8')]
@@ -358,13 +437,8 @@ if __name__ == '__main__':
 
     # check if config exists
     if not os.path.isfile(args.configfile):
-        config = configobj.ConfigObj(encoding="UTF8")
+        config = default_config()
         config.filename = args.configfile
-
-        config['speed_units'] = 'kph'
-        config['rpm_speed'] = {}
-        config['rpm_speed']['blocks'] = [' ', '\u258c', '\u2588']
-        config['rpm_speed']['vertical_line'] = '\u2502'
         config.write()
         logging.info('Config created')
 
@@ -377,7 +451,12 @@ if __name__ == '__main__':
 
 
     patch_irsdk()
-    ir = irsdk.IRSDK()
+    if args.replay:
+        ir = ReplayIRSDK(args.replay, args.speed)
+        tick_rate = TICK_RATE * args.speed
+    else:
+        ir = irsdk.IRSDK()
+        tick_rate = TICK_RATE
     ir.startup(test_file=args.test, dump_to=args.dump)
     if not ir.is_connected:
         sys.exit(0)
@@ -386,20 +465,43 @@ if __name__ == '__main__':
         sys.exit(0)
 
     state = State()
+    profiler.enabled = bool(args.profile)
+    reference_path = args.reference
+    if args.record:
+        recorder = Recorder(args.record)
 
     try:
         if args.test or args.dump:
             main()
         else:
             app = QApplication([])
-            controlsWindow = ControlsWindow(ir, state, cfg)
-            timer = QtCore.QTimer();
-            timer.timeout.connect(main)
-            timer.start(1/60);
-            sys.exit(app.exec_())
+            # the update loop owns state on the poller thread, the windows
+            # and drawers read the copy published for each tick
+            poller = TelemetryPoller(ir, main, snapshot, tick_rate)
+            controlsWindow = ControlsWindow(ir, State(), cfg, poller.submit)
+            fps = args.fps or int(cfg.get('overlay_fps', 60))
+            # half of each frame for painting, the rest for the update loop
+            controlsWindow.overlayWindow.frame_budget = 0.5 / fps
+            if args.replay and args.seek is not None:
+                seek(args.seek)
+            scheduler = FrameScheduler(poller, controlsWindow.state, controlsWindow.overlayWindow, fps)
+            scheduler.start()
+            try:
+                sys.exit(app.exec_())
+            finally:
+                scheduler.stop()
 
 
     except KeyboardInterrupt:
         pass
     except:
         logging.exception('')
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if args.replay:
+            # removes the temporary memory map behind the replay
+            ir.close()
+        if args.profile:
+            logging.info(profiler.tickText())
+            profiler.dump(args.profile)
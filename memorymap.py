@@ -0,0 +1,85 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import struct
+import tempfile
+import numpy as np
+from telemetry import VAR_DTYPES
+
+HEADER_LEN = 112
+VAR_HEADER_LEN = 144
+BUF_COUNT = 3
+STATUS_CONNECTED = 1
+
+
+class MemoryMap:
+    # a file laid out like the sim's shared memory, kept open through a
+    # writable map so pyirsdk can read it with startup(test_file=path) while
+    # ticks and session info are written into it
+
+    def __init__(self, schema, info_len, tick_rate=60, path=None):
+        self.schema = schema
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.bin')
+            os.close(fd)
+        self.path = path
+        self.offsets = {}
+        self.buf_len = 0
+        for name, var_type, count in schema:
+            self.offsets[name] = self.buf_len
+            self.buf_len += VAR_DTYPES[var_type].itemsize * count
+        self.info_offset = HEADER_LEN + VAR_HEADER_LEN * len(schema)
+        self.info_len = info_len
+        self.buf_offset = (self.info_offset + info_len + 15) // 16 * 16
+
+        mem = bytearray(self.buf_offset + self.buf_len * BUF_COUNT)
+        struct.pack_into('12i', mem, 0, 2, STATUS_CONNECTED, tick_rate, 0, 0, self.info_offset, len(schema),
+            HEADER_LEN, BUF_COUNT, self.buf_len, 0, 0)
+        for i in range(BUF_COUNT):
+            struct.pack_into('2i', mem, 48 + i * 16, 0, self.buf_offset + i * self.buf_len)
+        for i, (name, var_type, count) in enumerate(schema):
+            struct.pack_into('3i?', mem, HEADER_LEN + VAR_HEADER_LEN * i, var_type, self.offsets[name], count, False)
+            struct.pack_into('32s', mem, HEADER_LEN + VAR_HEADER_LEN * i + 16, name.encode())
+        with open(self.path, 'wb') as f:
+            f.write(mem)
+
+        self.file = open(self.path, 'r+b')
+        self.mem = mmap.mmap(self.file.fileno(), 0)
+        self.next_buf = 0
+
+    def values(self, buf):
+        # writable arrays over every var of one var buffer
+        start = self.buf_offset + buf * self.buf_len
+        return {name: np.frombuffer(self.mem, dtype=VAR_DTYPES[var_type], count=count,
+            offset=start + self.offsets[name]) for name, var_type, count in self.schema}
+
+    def nextBuffer(self):
+        # the oldest var buffer, the one the sim would write next
+        buf = self.next_buf
+        self.next_buf = (buf + 1) % BUF_COUNT
+        return buf
+
+    def publish(self, buf, tick_count):
+        struct.pack_into('i', self.mem, 48 + buf * 16, tick_count)
+        struct.pack_into('i', self.mem, 40, tick_count)
+        struct.pack_into('B', self.mem, 44, buf)
+
+    def writeRow(self, row, tick_count):
+        # row is one tick's var buffer bytes
+        buf = self.nextBuffer()
+        start = self.buf_offset + buf * self.buf_len
+        self.mem[start:start + self.buf_len] = row
+        self.publish(buf, tick_count)
+
+    def writeSessionInfo(self, update, info):
+        info = info[:self.info_len]
+        self.mem[self.info_offset:self.info_offset + len(info)] = info
+        self.mem[self.info_offset + len(info):self.info_offset + self.info_len] = bytes(self.info_len - len(info))
+        struct.pack_into('2i', self.mem, 12, update, len(info))
+
+    def close(self):
+        self.mem.close()
+        self.file.close()
+        os.remove(self.path)
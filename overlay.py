@@ -1,9 +1,14 @@
 #!python3
 # -*- coding: utf-8 -*-
 
+import math
 import sys
+import time
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import (QApplication)
+from profiler import profiler
+from constants import Priority
+import layers
 
 
 class OverlayWindow(QtWidgets.QWidget):
@@ -14,24 +19,144 @@ class OverlayWindow(QtWidgets.QWidget):
     rpm = 0
     speed = 0
     displayTach = True
+    frame = None
+    stamp = None
+    # seconds a paint may take before low priority drawers are deferred and
+    # drafted, None paints everything every frame as when rendering offline
+    frame_budget = None
 
     def __init__(self, parent=None):
         super(OverlayWindow, self).__init__(parent)
         self.setWindowTitle('iRacing HUD')
         self.drawers = {}
+        self.fingerprints = {}
+        self.rects = {}
+        self.refresh_periods = {}
+        self.layers = {}
+        self.stale = set()
+        self.draw_cost = 0
+        self.degraded = False
         self.setGeometry(3,20,1280,720)
         self.setWindowFlags(self.windowFlags() | QtCore.Qt.FramelessWindowHint | QtCore.Qt.WindowStaysOnTopHint)
         self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
 
     def addDrawer(self, drawer, key):
         self.drawers[key] = drawer
+        self.fingerprints.pop(key, None)
+        self.refresh_periods.pop(key, None)
+        if getattr(drawer, 'priority', Priority.HIGH) == Priority.LOW:
+            self.layers[key] = layers.DrawerLayer(drawer)
+        else:
+            self.layers.pop(key, None)
+        self.refresh(self.frame)
 
     def removeDrawer(self, key):
-        del self.drawers[key]
+        drawer = self.drawers.pop(key)
+        if hasattr(drawer, 'close'):
+            drawer.close()
+        self.fingerprints.pop(key, None)
+        self.refresh_periods.pop(key, None)
+        self.layers.pop(key, None)
+        self.stale.discard(key)
+        rect = self.rects.pop(key, None)
+        if rect is not None:
+            self.update(rect)
+
+    def refresh(self, frame, stamp=None):
+        # invalidate only the drawers whose inputs changed since last tick,
+        # stamp is the profiler's stamp of the tick frame was read on
+        if frame is None:
+            if self.frame is not None:
+                self.frame = None
+                self.stamp = None
+                # nothing is on screen now, the next frame repaints every drawer
+                self.fingerprints.clear()
+                self.rects.clear()
+                self.refresh_periods.clear()
+                self.stale.clear()
+                self.update()
+            return
+        self.frame = frame
+        self.stamp = stamp if stamp is not None else profiler.stamp
+        session_time = frame['SessionTime']
+
+        dirty = QtGui.QRegion()
+        for key, drawer in self.drawers.items():
+            # drawers with a refresh rate are looked at once per 1 / rate of
+            # session time, counted from 0 so a replay started anywhere
+            # refreshes them on the same ticks
+            rate = getattr(drawer, 'refresh_rate', 0)
+            if rate:
+                period = math.floor(session_time * rate)
+                if self.refresh_periods.get(key) == period:
+                    continue
+                self.refresh_periods[key] = period
+            fingerprint = drawer.fingerprint(frame)
+            if key in self.fingerprints and self.fingerprints[key] == fingerprint:
+                continue
+            self.fingerprints[key] = fingerprint
+            rect = drawer.rect()
+            if rect.isEmpty():
+                profiler.call('draw.' + key, drawer.draw, None, frame)
+                continue
+            dirty += rect
+            if key in self.rects:
+                dirty += self.rects[key]
+            self.rects[key] = rect
+            if key in self.layers:
+                self.stale.add(key)
+
+        # layers left out of date by a frame over budget
+        for key in self.stale:
+            dirty += self.rects[key]
+
+        if not dirty.isEmpty():
+            self.update(dirty)
+        else:
+            profiler.unchangedTick(self.stamp)
 
     def paintEvent(self, event):
+        if self.frame is None:
+            return
+        # one painter per frame, each drawer starts from a clean painter state
+        start = time.perf_counter()
+        region = event.region()
+
+        # bring low priority layers up to date while the high priority
+        # drawers still fit in the budget, the rest show their last output
+        ratio = self.devicePixelRatioF()
+        for key in [key for key in self.drawers if key in self.stale]:
+            layer = self.layers[key]
+            if self.frame_budget and layer.pixmap is not None and \
+                time.perf_counter() - start + self.draw_cost > self.frame_budget:
+                continue
+            profiler.call('draw.' + key, layer.render, self.frame, self.rects[key], ratio, self.degraded)
+            self.stale.discard(key)
+
+        p = QtGui.QPainter(self)
+        draw_cost = 0
         for key, value in self.drawers.items():
-            value.draw(self)
+            if not key in self.rects or not region.intersects(self.rects[key]):
+                continue
+            if key in self.layers:
+                self.layers[key].draw(p)
+                continue
+            draw_start = time.perf_counter()
+            p.save()
+            profiler.call('draw.' + key, value.draw, p, self.frame)
+            p.restore()
+            draw_cost += time.perf_counter() - draw_start
+        p.end()
+        self.draw_cost = draw_cost
+
+        elapsed = time.perf_counter() - start
+        if self.frame_budget:
+            # draft the layers from an over budget frame until paints take
+            # well under the budget again
+            self.degraded = elapsed > self.frame_budget or (self.degraded and elapsed > self.frame_budget / 2)
+        if profiler.enabled:
+            profiler.add('stage.paint', elapsed)
+            profiler.paintedTick(self.stamp)
 
 
 def main():
@@ -0,0 +1,160 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import math
+import time
+
+# buckets per doubling of the duration, from 1 us up to about 4 s
+SUBDIVISIONS = 4
+BUCKETS = 22 * SUBDIVISIONS
+# how often the tick latency is written to the log while profiling
+LOG_INTERVAL = 10
+
+
+class Histogram:
+    # durations counted into fixed log spaced buckets, adding a sample never
+    # allocates so it can run on every tick and every paint
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, seconds):
+        us = seconds * 1e6
+        bucket = int(math.log2(us) * SUBDIVISIONS) + 1 if us >= 1 else 0
+        self.counts[min(bucket, BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, q):
+        # upper edge of the bucket holding the q-th sample, in seconds
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bucketEdge(bucket), self.max)
+        return 0
+
+
+def bucketEdge(bucket):
+    return 2 ** (bucket / SUBDIVISIONS) / 1e6
+
+
+class TickStamp:
+    # a telemetry tick and when main() read it, carried by the overlay from
+    # refresh() to the paintEvent that shows it
+    __slots__ = ('tick', 'time', 'paints', 'unchanged')
+
+    def __init__(self, tick, time):
+        self.tick = tick
+        self.time = time
+        self.paints = 0
+        self.unchanged = False
+
+
+class Profiler:
+    # one histogram per drawer and per stage of the update loop, names are
+    # 'stage.<name>' and 'draw.<key>'; a disabled profiler only calls through
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.stamp = None
+        self.ticks_read = 0
+        self.ticks_painted = 0
+        self.ticks_repainted = 0
+        self.ticks_unchanged = 0
+        self.log_time = time.perf_counter()
+
+    def stampTick(self, tick):
+        if self.enabled:
+            self.stamp = TickStamp(tick, time.perf_counter())
+            self.ticks_read += 1
+
+    def unchangedTick(self, stamp):
+        # refreshed without anything to repaint, nothing to show for it
+        if stamp is not None and not stamp.unchanged and not stamp.paints:
+            stamp.unchanged = True
+            self.ticks_unchanged += 1
+
+    def paintedTick(self, stamp):
+        if stamp is None or not self.enabled:
+            return
+        now = time.perf_counter()
+        if stamp.paints:
+            self.ticks_repainted += 1
+        else:
+            if stamp.unchanged:
+                stamp.unchanged = False
+                self.ticks_unchanged -= 1
+            self.ticks_painted += 1
+            self.add('latency.tick_to_paint', now - stamp.time)
+        stamp.paints += 1
+        if now - self.log_time >= LOG_INTERVAL:
+            self.log_time = now
+            logging.info(self.tickText())
+
+    def ticksDropped(self):
+        # read but superseded before any paint showed them
+        pending = self.stamp is not None and not self.stamp.paints and not self.stamp.unchanged
+        return max(0, self.ticks_read - self.ticks_painted - self.ticks_unchanged - pending)
+
+    def tickText(self):
+        latency = self.histograms.get('latency.tick_to_paint', Histogram())
+        return 'ticks read {} painted {} twice {} unchanged {} dropped {}, latency p50 {:.1f} ms p99 {:.1f} ms'.format(
+            self.ticks_read, self.ticks_painted, self.ticks_repainted, self.ticks_unchanged, self.ticksDropped(),
+            latency.percentile(.5) * 1e3, latency.percentile(.99) * 1e3)
+
+    def add(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(seconds)
+
+    def call(self, name, func, *args):
+        if not self.enabled:
+            return func(*args)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def summary(self):
+        # (name, count, mean, p50, p99, max) in seconds, sorted by name
+        return [(name, h.count, h.mean(), h.percentile(.5), h.percentile(.99), h.max)
+            for name, h in sorted(self.histograms.copy().items())]
+
+    def text(self):
+        lines = ['{:<20}{:>8}{:>9}{:>9}{:>9}{:>9}'.format('us', 'count', 'mean', 'p50', 'p99', 'max')]
+        for name, count, *times in self.summary():
+            lines.append('{:<20}{:>8}'.format(name, count) + ''.join('{:>9.0f}'.format(t * 1e6) for t in times))
+        lines.append(self.tickText())
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        result = {}
+        for name, count, mean, p50, p99, maximum in self.summary():
+            result[name] = dict(count=count, mean=mean, p50=p50, p99=p99, max=maximum,
+                buckets={'%.6g' % bucketEdge(bucket): n for bucket, n in enumerate(self.histograms[name].counts) if n})
+        result['ticks'] = dict(read=self.ticks_read, painted=self.ticks_painted, repainted=self.ticks_repainted,
+            unchanged=self.ticks_unchanged, dropped=self.ticksDropped())
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+# shared by the update loop, the overlay and the controls window
+profiler = Profiler()
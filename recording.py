@@ -0,0 +1,314 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import bisect
+import collections
+import queue
+import struct
+import logging
+import threading
+import zlib
+import numpy as np
+from telemetry import VAR_DTYPES, FRAME_VARS, session_info_bytes
+from state import State
+
+# a recording is MAGIC followed by chunks, each a CHUNK header and a zlib
+# compressed payload:
+#   VARS  json list of [name, irsdk var type, count], once at the start
+#   INFO  session info yaml, count is its SessionInfoUpdate
+#   DATA  count ticks of every var, one column after another in VARS order,
+#         then the SessionInfoUpdate header field of each tick
+#   KEYF  State.dumps() as it was after the tick-th tick, count is the tick
+#   INDX  json offsets of every INFO, DATA and KEYF chunk, written on close
+# and a closed recording ends with TRAILER pointing at its INDX chunk
+MAGIC = b'IHOREC\x03\n'
+CHUNK = struct.Struct('<4sIId')    # kind, payload length, count, session time
+TRAILER = struct.Struct('<Q8s')    # offset of the INDX chunk, INDEX_MAGIC
+INDEX_MAGIC = b'IHOIDX\x01\n'
+VARS = b'VARS'
+INFO = b'INFO'
+DATA = b'DATA'
+KEYF = b'KEYF'
+INDX = b'INDX'
+
+# ten seconds of ticks per data chunk
+BLOCK_TICKS = 600
+# finished blocks waiting for the writer before new ones are dropped
+MAX_PENDING = 8
+# ticks between State keyframes, seeking replays at most this many ticks
+KEYFRAME_TICKS = 600
+# decoded data chunks a reader keeps around
+BLOCK_CACHE = 3
+# the session info counter is a header field, not a var, so the recorder
+# keeps its own column of it
+INFO_UPDATE = ('SessionInfoUpdate', 2, 1)
+
+# unsigned ints the same size as each var type, so deltas wrap instead of
+# overflowing and floats round trip bit for bit
+_BITS = {1: np.dtype('<u1'), 4: np.dtype('<u4'), 8: np.dtype('<u8')}
+
+
+def encode_column(column):
+    # delta against the previous tick then split into byte planes, both turn
+    # slowly changing telemetry into long runs zlib squeezes well
+    bits = column.view(_BITS[column.dtype.itemsize])
+    delta = bits.copy()
+    delta[1:] -= bits[:-1]
+    return delta.view(np.uint8).reshape(-1, column.dtype.itemsize).T.tobytes()
+
+
+def decode_column(data, dtype, ticks, count):
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, ticks * count)
+    delta = planes.T.copy().view(_BITS[dtype.itemsize]).reshape(ticks, count)
+    return np.cumsum(delta, axis=0, dtype=delta.dtype).view(dtype)
+
+
+class Recorder:
+    # appends every tick to a recording; the update loop only copies values
+    # into the current block, compression and file io run on a background
+    # thread and at most MAX_PENDING blocks are ever held in memory
+
+    def __init__(self, path, names=FRAME_VARS, block_ticks=BLOCK_TICKS, keyframe_ticks=KEYFRAME_TICKS, level=6):
+        self.path = path
+        self.names = names
+        self.block_ticks = block_ticks
+        self.keyframe_ticks = keyframe_ticks
+        self.level = level
+        self.schema = None
+        self.columns = None
+        self.row = 0
+        self.tick_count = 0
+        self.last_keyframe = None
+        self.index = {'infos': [], 'blocks': [], 'keyframes': []}
+        self.block_time = 0
+        self.session_info_update = None
+        self.dropped = 0
+        self.queue = queue.Queue(MAX_PENDING)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.thread = threading.Thread(target=self.run, name='Recorder', daemon=True)
+        self.thread.start()
+
+    def start(self, ir):
+        var_headers = ir._var_headers_dict
+        self.schema = [(name, var_headers[name].type, var_headers[name].count)
+            for name in self.names if name in var_headers]
+        self.put((VARS, 0, 0, json.dumps(self.schema).encode('utf-8')), block=True)
+        self.columns = self.newColumns()
+
+    def newColumns(self):
+        return [np.zeros((self.block_ticks, count), dtype=VAR_DTYPES[var_type])
+            for name, var_type, count in self.schema + [INFO_UPDATE]]
+
+    def add(self, ir, frame):
+        if self.schema is None:
+            self.start(ir)
+
+        update = ir.session_info_update
+        if update != self.session_info_update:
+            self.session_info_update = update
+            self.put((INFO, update, frame['SessionTime'], session_info_bytes(ir)), block=True)
+
+        if self.row == 0:
+            self.block_time = frame['SessionTime']
+        for (name, var_type, count), column in zip(self.schema, self.columns):
+            column[self.row] = frame[name]
+        self.columns[-1][self.row] = update
+        self.row += 1
+        self.tick_count += 1
+        if self.row == self.block_ticks:
+            self.flush()
+
+    def keyframe(self, state):
+        # called after the update loop has run on the last added tick
+        tick = self.tick_count - 1
+        if self.last_keyframe is not None and tick - self.last_keyframe < self.keyframe_ticks:
+            return
+        self.last_keyframe = tick
+        self.put((KEYF, tick, state.cur_session_time, state.dumps()))
+
+    def flush(self):
+        if self.row:
+            self.put((DATA, self.row, self.block_time, [column[:self.row] for column in self.columns]))
+            self.columns = self.newColumns()
+            self.row = 0
+
+    def put(self, item, block=False):
+        # only telemetry blocks are dropped, a recording can't be read back
+        # without its schema and session info
+        try:
+            self.queue.put(item, block)
+        except queue.Full:
+            self.dropped += 1
+            logging.warning('recorder falling behind, dropped %d blocks' % self.dropped)
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        offset = self.file.tell()
+        self.writeChunk(INDX, 0, 0, zlib.compress(json.dumps(self.index).encode('utf-8'), self.level))
+        self.file.write(TRAILER.pack(offset, INDEX_MAGIC))
+        self.file.close()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            kind, count, session_time, payload = item
+            try:
+                if kind == DATA:
+                    payload = b''.join(encode_column(column) for column in payload)
+                self.writeChunk(kind, count, session_time, zlib.compress(payload, self.level))
+            except Exception:
+                logging.exception('error writing recording %s' % self.path)
+
+    def writeChunk(self, kind, count, session_time, payload):
+        self.file.write(CHUNK.pack(kind, len(payload), count, session_time))
+        offset = self.file.tell()
+        self.file.write(payload)
+        if kind == INFO:
+            self.index['infos'].append((offset, len(payload), count))
+        elif kind == DATA:
+            self.index['blocks'].append((offset, len(payload), count, session_time))
+        elif kind == KEYF:
+            self.index['keyframes'].append((offset, len(payload), count, session_time))
+
+
+class Recording:
+    # random access over a recording, the index (or the chunk headers of a
+    # recording that was never closed) and session info are read on open,
+    # data blocks and keyframes are decompressed when first needed
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a recording' % path)
+        self.schema = []
+        self.infos = {}
+        # offset, length, ticks, session time and index of the first tick
+        self.blocks = []
+        # offset, length, tick and session time
+        self.keyframes = []
+        self.tick_count = 0
+        self._blocks = collections.OrderedDict()
+
+        size = os.fstat(self.file.fileno()).st_size
+        if not self.readIndex(size):
+            self.scan(size)
+
+    def readChunk(self, offset, length):
+        self.file.seek(offset)
+        return zlib.decompress(self.file.read(length))
+
+    def readIndex(self, size):
+        if size < len(MAGIC) + CHUNK.size + TRAILER.size:
+            return False
+        self.file.seek(size - TRAILER.size)
+        offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != INDEX_MAGIC:
+            return False
+        kind, length, count, session_time = CHUNK.unpack(self.readChunkHeader(len(MAGIC)))
+        self.schema = [tuple(var) for var in json.loads(self.readChunk(len(MAGIC) + CHUNK.size, length))]
+        kind, length, count, session_time = CHUNK.unpack(self.readChunkHeader(offset))
+        index = json.loads(self.readChunk(offset + CHUNK.size, length))
+        for offset, length, update in index['infos']:
+            self.infos[update] = self.readChunk(offset, length)
+        for offset, length, count, session_time in index['blocks']:
+            self.blocks.append((offset, length, count, session_time, self.tick_count))
+            self.tick_count += count
+        self.keyframes = [tuple(keyframe) for keyframe in index['keyframes']]
+        return True
+
+    def readChunkHeader(self, offset):
+        self.file.seek(offset)
+        return self.file.read(CHUNK.size)
+
+    def scan(self, size):
+        offset = len(MAGIC)
+        self.file.seek(offset)
+        while True:
+            header = self.file.read(CHUNK.size)
+            if len(header) < CHUNK.size:
+                break
+            kind, length, count, session_time = CHUNK.unpack(header)
+            offset += CHUNK.size
+            if offset + length > size:
+                # cut short by a crash, keep what was fully written
+                break
+            if kind == DATA:
+                self.blocks.append((offset, length, count, session_time, self.tick_count))
+                self.tick_count += count
+                self.file.seek(length, 1)
+            elif kind == KEYF:
+                self.keyframes.append((offset, length, count, session_time))
+                self.file.seek(length, 1)
+            else:
+                payload = zlib.decompress(self.file.read(length))
+                if kind == VARS:
+                    self.schema = [tuple(var) for var in json.loads(payload)]
+                elif kind == INFO:
+                    self.infos[count] = payload
+            offset += length
+
+    def close(self):
+        self.file.close()
+
+    def info(self, update):
+        # session info current at SessionInfoUpdate update
+        if update in self.infos:
+            return self.infos[update]
+        older = [u for u in self.infos if u <= update]
+        return self.infos[max(older)] if older else b''
+
+    def block(self, idx):
+        # {name: array of ticks x count} for data chunk idx
+        columns = self._blocks.get(idx)
+        if columns is None:
+            offset, length, count, session_time, first_tick = self.blocks[idx]
+            data = self.readChunk(offset, length)
+            columns = {}
+            pos = 0
+            for name, var_type, var_count in self.schema + [INFO_UPDATE]:
+                dtype = VAR_DTYPES[var_type]
+                size = dtype.itemsize * var_count * count
+                columns[name] = decode_column(data[pos:pos + size], dtype, count, var_count)
+                pos += size
+            self._blocks[idx] = columns
+            if len(self._blocks) > BLOCK_CACHE:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(idx)
+        return columns
+
+    def locate(self, tick):
+        # data chunk and row holding the tick-th tick of the recording
+        for idx, (offset, length, count, session_time, first_tick) in enumerate(self.blocks):
+            if tick < first_tick + count:
+                return idx, tick - first_tick
+        raise IndexError('tick %d past end of recording' % tick)
+
+    def tickAt(self, session_time):
+        # last tick at or before session_time, session time only runs
+        # forward within one session so seek within the session recorded
+        starts = [block[3] for block in self.blocks]
+        idx = max(bisect.bisect_right(starts, session_time) - 1, 0)
+        times = self.block(idx)['SessionTime'][:, 0]
+        row = max(int(np.searchsorted(times, session_time, 'right')) - 1, 0)
+        return self.blocks[idx][4] + row
+
+    def sessionTime(self, tick):
+        idx, row = self.locate(tick)
+        return float(self.block(idx)['SessionTime'][row, 0])
+
+    def keyframe(self, tick):
+        # (tick, State) of the last keyframe before tick, (-1, None) if none
+        i = bisect.bisect_left([keyframe[2] for keyframe in self.keyframes], tick) - 1
+        if i < 0:
+            return -1, None
+        offset, length, key_tick, session_time = self.keyframes[i]
+        return key_tick, State.loads(self.readChunk(offset, length))
@@ -0,0 +1,101 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import numpy as np
+
+# grid points over the lap, the reference is kept at every 1/POINTS of a lap
+POINTS = 1000
+
+
+class ReferenceLap:
+    # time into the lap sampled against lap distance on a fixed grid, for the
+    # lap in progress and the reference it is compared with: the best timed
+    # lap of the camera car, or one loaded from file
+
+    def __init__(self, path=None, points=POINTS):
+        self.points = points
+        self.distances = np.linspace(0, 1, points + 1)
+        self.current = np.full(points + 1, np.nan)
+        self.reference = np.full(points + 1, np.nan)
+        self.lap_time = np.nan
+        self.path = path
+        self.car_idx = -1
+        self.lap_start = np.nan
+        self.laps = 0
+        self.last_pct = -1
+        self.last_elapsed = np.nan
+        # seconds behind the reference at the current position, nan if unknown
+        self.delta = np.nan
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            reference = np.load(f)
+        if reference.shape != self.reference.shape:
+            logging.warning('reference lap %s has %d points, expected %d' % (path, len(reference), len(self.reference)))
+            return
+        self.reference[:] = reference
+        self.lap_time = reference[-1]
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, self.reference)
+        os.replace(path + '.tmp', path)
+
+    def update(self, car_idx, session_time, pct, timing):
+        if car_idx != self.car_idx:
+            # joined mid-lap, timed against the reference but not recorded
+            self.car_idx = car_idx
+            self.current.fill(np.nan)
+            self.last_pct = -1
+            if car_idx >= 0:
+                self.lap_start = timing.lap_start[car_idx]
+                self.laps = timing.laps[car_idx]
+        if car_idx < 0:
+            self.delta = np.nan
+            return
+
+        # a new lap started, the one before becomes the reference when it
+        # was timed cleanly and is the fastest yet
+        lap_start = timing.lap_start[car_idx]
+        if lap_start != self.lap_start and not np.isnan(lap_start):
+            if timing.laps[car_idx] != self.laps and self.last_pct >= 0:
+                self.finishLap(timing.last_lap_time[car_idx])
+            self.lap_start = lap_start
+            self.laps = timing.laps[car_idx]
+            self.current.fill(np.nan)
+            self.current[0] = 0
+            self.last_pct = 0
+            self.last_elapsed = 0
+
+        elapsed = session_time - self.lap_start
+        if pct < 0 or np.isnan(elapsed):
+            self.delta = np.nan
+            return
+        # the sim can report the line itself as 1 after rounding to float32
+        pct %= 1
+        if self.last_pct >= 0 and pct > self.last_pct:
+            self.sample(pct, elapsed)
+        self.delta = elapsed - np.interp(pct, self.distances, self.reference)
+
+    def sample(self, pct, elapsed):
+        # fill the grid points passed since the last tick
+        first = int(self.last_pct * self.points) + 1
+        last = min(int(pct * self.points), self.points)
+        if last >= first:
+            grid = self.distances[first:last + 1]
+            self.current[first:last + 1] = np.interp(grid, (self.last_pct, pct), (self.last_elapsed, elapsed))
+        self.last_pct = pct
+        self.last_elapsed = elapsed
+
+    def finishLap(self, lap_time):
+        self.sample(1, lap_time)
+        if np.isnan(self.current).any() or lap_time >= self.lap_time:
+            return
+        self.reference[:] = self.current
+        self.lap_time = lap_time
+        if self.path is not None:
+            self.save(self.path)
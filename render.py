@@ -0,0 +1,192 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import os
+# render without a display, must be set before Qt is loaded
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import sys
+import math
+import shutil
+import logging
+import tempfile
+import argparse
+import contextlib
+import multiprocessing
+import configobj
+from PyQt5 import QtGui, QtCore
+from PyQt5.QtWidgets import QApplication
+from state import State
+from recording import Recording
+from replay import ReplayIRSDK
+from writer import FORMATS
+import main
+import overlay
+import drawers
+import resources
+
+DRAWERS = ('bg', 'timestamp', 'laps', 'inputs', 'positions', 'qual', 'delta', 'setup', 'tach')
+PRINTABLE = ''.join(map(chr, range(32, 127)))
+
+app = None
+
+
+def make_drawers(keys, ir, state, cfg, qual_time, setup, outlap=None):
+    factories = {
+        'bg': lambda: drawers.GreenScreenDrawer(),
+        'timestamp': lambda: drawers.TimeStampDrawer(ir, state),
+        'laps': lambda: drawers.LapDrawer(ir, state),
+        'inputs': lambda: drawers.InputsDrawer(ir, state),
+        'positions': lambda: drawers.PositionsDrawer(ir, state),
+        'qual': lambda: drawers.QualifyingTimeDrawer(ir, state, qual_time, outlap),
+        'delta': lambda: drawers.DeltaDrawer(ir, state),
+        'setup': lambda: drawers.SetupDrawer(ir, state, setup),
+        'tach': lambda: drawers.TachDrawer(ir, state, cfg['speed_units']),
+    }
+    return [(key, factories[key]()) for key in keys]
+
+
+def render_outlap(path, cfg, start_time):
+    # the camera car's lap at the first frame of the render
+    main.cfg = configobj.ConfigObj(cfg)
+    main.ir = ReplayIRSDK(path, 0)
+    main.ir.startup()
+    main.state = State()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            main.seek(start_time)
+        return int(main.state.frame['CarIdxLap'][main.state.cam_car_idx])
+    finally:
+        main.ir.close()
+
+
+def start_worker():
+    global app
+    app = QApplication([])
+
+
+def render_chunk(job):
+    # render frames first .. first + count - 1 of the output, seeking the
+    # replay to the first one, or a refresh period before it, and stepping
+    # tick by tick from there
+    (path, keys, cfg, first, count, fps, start_time, width, height, out_dir, raw, qual_time, setup, outlap) = job
+    main.cfg = configobj.ConfigObj(cfg)
+    main.ir = ReplayIRSDK(path, 0)
+    main.ir.startup()
+    main.state = State()
+    ir = main.ir
+    end_time = ir.recording.sessionTime(ir.recording.tick_count - 1)
+    img = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    raw_file = tempfile.NamedTemporaryFile(suffix='.rgba', delete=False) if raw else None
+    rendered = 0
+
+    # the update loop prints, keep it out of a raw stream on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        window = overlay.OverlayWindow()
+        window.resize(width, height)
+        rates = []
+        for key, drawer in make_drawers(keys, ir, main.state, main.cfg, qual_time, setup, outlap):
+            window.addDrawer(drawer, key)
+            if getattr(drawer, 'refresh_rate', 0):
+                rates.append(drawer.refresh_rate)
+
+        # text too large for the glyph cache is drawn from outlines that
+        # freetype leaves placed by whatever the same face last rasterized,
+        # so the glyphs this process happened to rasterize before a frame
+        # would show in it; cache every printable one up front, ending on
+        # whole pixels, so no frame rasterizes any
+        p = QtGui.QPainter(img)
+        resources.cacheGlyphs(p, PRINTABLE)
+        p.end()
+
+        # a drawer with a refresh rate shows what it was given at the start of
+        # its period, run the frames since then without writing them so the
+        # chunk comes out as it would from a render done in one piece
+        lead = min(first, math.ceil(fps / min(rates))) if rates else 0
+        main.seek(start_time + (first - lead) / fps)
+
+        for i in range(first - lead, first + count):
+            session_time = start_time + i / fps
+            if session_time > end_time:
+                break
+            tick = ir.recording.tickAt(session_time)
+            if tick > ir.position:
+                ir.step(range(ir.position + 1, tick + 1), main.main)
+            window.refresh(main.state.frame)
+            if i == first - lead:
+                # and paint the first frame once to leave the fonts as every
+                # later paint finds them
+                window.render(img)
+            img.fill(QtCore.Qt.transparent)
+            window.render(img)
+            if i < first:
+                continue
+            if raw:
+                rgba = img.convertToFormat(QtGui.QImage.Format_RGBA8888)
+                bits = rgba.constBits()
+                bits.setsize(rgba.sizeInBytes())
+                raw_file.write(bits)
+            else:
+                img.save(os.path.join(out_dir, 'frame_%06d.png' % i), *FORMATS['png'])
+            rendered += 1
+
+    ir.close()
+    if raw:
+        raw_file.close()
+        return rendered, raw_file.name
+    return rendered, None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='render the overlay for a recorded session offline')
+    parser.add_argument('recording', help='recorded session to render')
+    parser.add_argument('-o', '--out', help='directory for the png sequence, a raw rgba stream goes to stdout when omitted')
+    parser.add_argument('--drawers', nargs='+', choices=DRAWERS, default=['timestamp', 'laps', 'inputs', 'positions', 'tach'])
+    parser.add_argument('--start', help='first session time to render', type=float)
+    parser.add_argument('--end', help='last session time to render', type=float)
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--qual', help='qualifying time to beat', default='')
+    parser.add_argument('--setup', help='setup name', default='')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk', help='frames per job', type=int, default=300)
+    parser.add_argument('--configfile', help='config file', default='config.ini')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='{levelname:>8}: {message}', style='{', level=logging.INFO, stream=sys.stderr)
+    cfg = configobj.ConfigObj(args.configfile) if os.path.isfile(args.configfile) else main.default_config()
+
+    recording = Recording(args.recording)
+    if not recording.tick_count:
+        logging.error('No ticks in recording: %s' % args.recording)
+        sys.exit(1)
+    first_time = recording.sessionTime(0)
+    last_time = recording.sessionTime(recording.tick_count - 1)
+    recording.close()
+    start_time = max(args.start if args.start is not None else first_time, first_time)
+    end_time = min(args.end if args.end is not None else last_time, last_time)
+    frames = int((end_time - start_time) * args.fps) + 1
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    # every job times the qualifying lap from the out lap at the start of the
+    # render, not from wherever its own chunk starts
+    outlap = render_outlap(args.recording, cfg, start_time) if 'qual' in args.drawers else None
+
+    jobs = [(args.recording, args.drawers, cfg.dict(), first, min(args.chunk, frames - first), args.fps, start_time,
+        args.width, args.height, args.out, not args.out, args.qual, args.setup, outlap)
+        for first in range(0, frames, args.chunk)]
+    logging.info('rendering %d frames from %.2f to %.2f in %d jobs' % (frames, start_time, end_time, len(jobs)))
+
+    rendered = 0
+    with multiprocessing.Pool(args.jobs, initializer=start_worker) as pool:
+        # chunks come back in order, so a raw stream can be written as they finish
+        for count, raw_path in pool.imap(render_chunk, jobs):
+            rendered += count
+            if raw_path:
+                with open(raw_path, 'rb') as f:
+                    shutil.copyfileobj(f, sys.stdout.buffer)
+                os.remove(raw_path)
+    sys.stdout.flush()
+    logging.info('rendered %d frames' % rendered)
@@ -0,0 +1,131 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import numpy as np
+import irsdk
+from recording import Recording, INFO_UPDATE
+from memorymap import MemoryMap
+
+
+class ReplayIRSDK(irsdk.IRSDK):
+    # plays a recording back through pyirsdk itself: each tick is written into
+    # a MemoryMap when the replay clock reaches it, so ir[...], session info
+    # and read_frame() behave exactly as they do against the sim.
+    # speed 1 is real time, 2 twice as fast and 0 as fast as the update loop
+    # can consume ticks, one per freeze_var_buffer_latest()
+
+    def __init__(self, path, speed=1.0):
+        super(ReplayIRSDK, self).__init__()
+        self.recording = Recording(path)
+        self.speed = speed
+        self.memory = None
+        self.rows = None
+        self.block_idx = None
+        self.position = -1
+        self.consumed = -1
+        self.finished = False
+        self.holding = False
+        self.session_info = None
+        self.start_wall = 0
+        self.start_time = 0
+
+    def startup(self, test_file=None, dump_to=None):
+        if self.finished or not self.recording.tick_count:
+            return False
+        if self.memory is None:
+            info_len = max([len(info) for info in self.recording.infos.values()] + [0]) + 1
+            self.memory = MemoryMap(self.recording.schema, info_len)
+            self.start_time = self.recording.blocks[0][3]
+            self.start_wall = time.perf_counter()
+            self.seekTick(0)
+        return super(ReplayIRSDK, self).startup(test_file=self.memory.path, dump_to=dump_to)
+
+    def shutdown(self):
+        super(ReplayIRSDK, self).shutdown()
+        if self.finished and self.memory is not None:
+            self.rows = None
+            self.memory.close()
+            self.memory = None
+
+    def close(self):
+        self.finished = True
+        self.shutdown()
+        self.recording.close()
+
+    def loadBlock(self, idx):
+        # every tick of a data chunk laid out as var buffer rows
+        columns = self.recording.block(idx)
+        count = self.recording.blocks[idx][2]
+        rows = np.zeros((count, self.memory.buf_len), dtype=np.uint8)
+        for name, var_type, var_count in self.recording.schema:
+            column = columns[name].reshape(count, -1).view(np.uint8)
+            offset = self.memory.offsets[name]
+            rows[:, offset:offset + column.shape[1]] = column
+        self.block_idx = idx
+        self.rows = rows
+        self.columns = columns
+
+    def seekTick(self, tick):
+        idx, row = self.recording.locate(tick)
+        if idx != self.block_idx:
+            self.loadBlock(idx)
+        self.position = tick
+        self.row = row
+
+        update = int(self.columns[INFO_UPDATE[0]][row, 0])
+        if update != self.session_info:
+            self.session_info = update
+            self.memory.writeSessionInfo(update, self.recording.info(update))
+        tick_count = int(self.columns['SessionTick'][row, 0]) if 'SessionTick' in self.columns else tick
+        self.memory.writeRow(self.rows[row].tobytes(), tick_count)
+
+    def advance(self):
+        if self.memory is None or self.finished or self.holding:
+            return
+        last = self.recording.tick_count - 1
+        if self.speed <= 0:
+            target = self.consumed + 1
+        else:
+            # every tick whose session time the replay clock has passed
+            clock = self.start_time + (time.perf_counter() - self.start_wall) * self.speed
+            target = self.position
+            while target < last and self.recording.sessionTime(target + 1) <= clock:
+                target += 1
+            if target == last and clock > self.recording.sessionTime(last) + 1:
+                target = last + 1
+        if target > last:
+            # end of the recording looks like the sim closing
+            logging.info('replay finished')
+            self.finished = True
+        elif target != self.position:
+            self.seekTick(target)
+
+    def step(self, ticks, update):
+        # run update on each of ticks in turn, the replay clock then carries
+        # on from the last of them
+        self.holding = True
+        try:
+            for tick in ticks:
+                self.seekTick(tick)
+                update()
+        finally:
+            self.holding = False
+        self.consumed = self.position
+        self.start_time = self.recording.sessionTime(self.position)
+        self.start_wall = time.perf_counter()
+
+    @property
+    def is_connected(self):
+        return not self.finished and super(ReplayIRSDK, self).is_connected
+
+    def freeze_var_buffer_latest(self):
+        self.advance()
+        self.consumed = self.position
+        super(ReplayIRSDK, self).freeze_var_buffer_latest()
+
+    def __getitem__(self, key):
+        if self.speed > 0:
+            self.advance()
+        return super(ReplayIRSDK, self).__getitem__(key)
@@ -0,0 +1,63 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+from PyQt5 import QtGui, QtCore
+
+# fonts, pens and laid out labels shared by every drawer, built on first use
+# so drawers never allocate or shape constant content while painting
+_fonts = {}
+_pens = {}
+_static_texts = {}
+
+
+def font(family, size, weight=QtGui.QFont.Normal):
+    key = (family, size, weight)
+    result = _fonts.get(key)
+    if result is None:
+        result = _fonts[key] = QtGui.QFont(family, size, weight)
+    return result
+
+
+def cacheGlyphs(p, text):
+    # rasterize every glyph of text in every font built so far at each of
+    # the quarter pixel offsets glyphs are cached at, whole pixels last
+    for x in (0.75, 0.5, 0.25, 0):
+        for font in _fonts.values():
+            p.setFont(font)
+            for c in text:
+                p.drawText(QtCore.QPointF(x, 0), c)
+
+
+def pen(color, width=1, cap_style=QtCore.Qt.SquareCap):
+    key = (color.rgba(), width, cap_style)
+    result = _pens.get(key)
+    if result is None:
+        result = _pens[key] = QtGui.QPen(color)
+        result.setWidth(width)
+        result.setCapStyle(cap_style)
+    return result
+
+
+def staticText(text, font):
+    key = (text, font.key())
+    result = _static_texts.get(key)
+    if result is None:
+        result = _static_texts[key] = QtGui.QStaticText(text)
+        result.setTextFormat(QtCore.Qt.PlainText)
+        result.setPerformanceHint(QtGui.QStaticText.AggressiveCaching)
+        result.prepare(QtGui.QTransform(), font)
+    return result
+
+
+def drawStaticText(p, x, y, w, h, flags, text):
+    # same placement as QPainter.drawText(x, y, w, h, flags, str)
+    size = text.size()
+    if flags & QtCore.Qt.AlignRight:
+        x += w - size.width()
+    elif flags & QtCore.Qt.AlignHCenter:
+        x += (w - size.width()) / 2
+    if flags & QtCore.Qt.AlignBottom:
+        y += h - size.height()
+    elif flags & QtCore.Qt.AlignVCenter:
+        y += (h - size.height()) / 2
+    p.drawStaticText(QtCore.QPointF(x, y), text)
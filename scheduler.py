@@ -0,0 +1,152 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+from PyQt5 import QtCore
+from telemetry import latest_tick
+from profiler import profiler
+
+TICK_RATE = 60
+# poll a little early so a new tick is picked up as soon as it lands
+TICK_MARGIN = 0.002
+# how often to look for the sim while disconnected or the data has stalled
+IDLE_INTERVAL = 1
+
+
+class DoubleBuffer:
+    # the writer fills the back slot and swaps it to the front once complete,
+    # the reader only ever sees whole published values; a swap is a single
+    # reference assignment so neither side takes a lock
+
+    def __init__(self):
+        self.slots = [None, None]
+        self.front = 0
+
+    def publish(self, value):
+        back = 1 - self.front
+        self.slots[back] = value
+        self.front = back
+
+    def read(self):
+        return self.slots[self.front]
+
+
+class TelemetryPoller:
+    # owns the irsdk handle: runs the update pipeline on its own thread once
+    # per new tick and publishes a snapshot of the result when it is done, so
+    # a slow session info parse never holds up painting
+
+    def __init__(self, ir, update, snapshot, tick_rate=TICK_RATE):
+        self.ir = ir
+        self.update = update
+        self.snapshot = snapshot
+        # a tick rate of 0 means ticks are always ready, as when replaying
+        # a recording as fast as possible
+        self.tick_interval = 1 / tick_rate if tick_rate > 0 else 0
+        self.buffer = DoubleBuffer()
+        # calls from other threads that need the irsdk handle
+        self.commands = queue.Queue()
+        self.last_tick = None
+        self.tick_time = 0
+        self.update_time = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='TelemetryPoller', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, func, *args):
+        self.commands.put((func, args))
+
+    def runCommands(self):
+        while True:
+            try:
+                func, args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(*args)
+            except Exception:
+                logging.exception('error in telemetry command')
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.runCommands()
+            now = time.perf_counter()
+            try:
+                tick = latest_tick(self.ir)
+            except Exception:
+                tick = None
+
+            # a new tick runs the pipeline, a stalled or missing connection
+            # only gets checked once in a while so main() can reconnect
+            if (tick is not None and tick != self.last_tick) or now - self.update_time >= IDLE_INTERVAL:
+                if tick != self.last_tick:
+                    self.tick_time = now
+                self.last_tick = tick
+                self.update_time = now
+                try:
+                    frame = profiler.call('stage.tick', self.update)
+                    self.buffer.publish(profiler.call('stage.snapshot', self.snapshot, frame))
+                except Exception:
+                    logging.exception('error in telemetry update')
+                now = time.perf_counter()
+
+            self.stopped.wait(self.nextInterval(now))
+
+    def nextInterval(self, now):
+        if self.last_tick is None or now - self.tick_time >= IDLE_INTERVAL:
+            wake = self.update_time + IDLE_INTERVAL
+        else:
+            wake = self.tick_time + self.tick_interval - TICK_MARGIN
+        if wake <= now:
+            # tick is late, keep checking every millisecond
+            return 0.001 if self.tick_interval else 0
+        return wake - now
+
+
+class FrameScheduler(QtCore.QObject):
+    # hands the newest tick published by the poller to the overlay at most
+    # fps times a second, on the GUI thread
+
+    def __init__(self, poller, state, overlay, fps=60, parent=None):
+        super(FrameScheduler, self).__init__(parent)
+        self.poller = poller
+        self.state = state
+        self.overlay = overlay
+        self.frame_interval = 1 / fps
+        self.published = None
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.poll)
+
+    def start(self):
+        self.poller.start()
+        self.timer.start(max(1, int(self.frame_interval * 1000)))
+
+    def stop(self):
+        self.timer.stop()
+        self.poller.stop()
+
+    def poll(self):
+        published = self.poller.buffer.read()
+        if published is None or published is self.published:
+            return
+        self.published = published
+        snapshot, stamp = published
+        if snapshot is None:
+            profiler.call('stage.refresh', self.overlay.refresh, None)
+            return
+        # the drawers keep their reference to the GUI side state
+        self.state.restore(snapshot)
+        profiler.call('stage.refresh', self.overlay.refresh, snapshot.frame, stamp)
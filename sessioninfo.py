@@ -0,0 +1,28 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+
+class SessionInfo:
+    # session info sections read through ir[...] once per SessionInfoUpdate.
+    # pyirsdk keeps sections it has parsed, but a section the sim never wrote
+    # costs a regex search over the whole yaml on every read; those are
+    # remembered here as None until the session info changes
+
+    def __init__(self, ir):
+        self.ir = ir
+        self.update = -1
+        self.sections = {}
+
+    def refresh(self):
+        update = self.ir.session_info_update
+        if update != self.update:
+            self.update = update
+            self.sections = {}
+        return update
+
+    def __getitem__(self, key):
+        self.refresh()
+        if key in self.sections:
+            return self.sections[key]
+        result = self.sections[key] = self.ir[key]
+        return result
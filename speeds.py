@@ -0,0 +1,50 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from telemetry import CAR_COUNT
+
+SPEED_WINDOW = 10
+MAX_SPEED = 110
+
+
+class Speeds:
+    # lap distance of every car over the last few ticks in a ring, speed is
+    # the distance covered across the window over the time it took
+
+    def __init__(self, window=SPEED_WINDOW, car_count=CAR_COUNT):
+        self.window = window
+        self.pcts = np.full((window, car_count), np.nan)
+        self.times = np.full(window, np.nan)
+        self.head = -1
+        self.count = 0
+
+    def reset(self):
+        self.pcts.fill(np.nan)
+        self.times.fill(np.nan)
+        self.head = -1
+        self.count = 0
+
+    def update(self, session_time, pcts):
+        if self.count and session_time < self.times[self.head]:
+            self.reset()
+
+        self.head = (self.head + 1) % self.window
+        row = self.pcts[self.head]
+        row[:] = pcts
+        # cars out of the world report -1
+        row[row < 0] = np.nan
+        self.times[self.head] = session_time
+        self.count = min(self.count + 1, self.window)
+
+    def speeds(self, track_length):
+        # metres per second for every car, 0 when unknown or implausible
+        if self.count < 2:
+            return np.zeros(self.pcts.shape[1])
+        oldest = (self.head - self.count + 1) % self.window
+        diff_pct = (self.pcts[self.head] - self.pcts[oldest]) % 1
+        diff_time = self.times[self.head] - self.times[oldest]
+        if diff_time <= 0:
+            return np.zeros(self.pcts.shape[1])
+        speed = track_length * diff_pct / diff_time * 1000
+        return np.where((speed > 0) & (speed <= MAX_SPEED), speed, 0)
@@ -0,0 +1,99 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def sort_by_lap_distance(diff):
+    # vectorised, wraps differences into half a lap either side
+    return np.where(diff < -.5, diff + 1, np.where(diff > .5, diff - 1, diff))
+
+
+def running_key(drivers, order):
+    return sort_by_lap_distance(drivers.overall_distance[order])
+
+
+class Standings:
+    # running order, finishing order and gap strings shared by every drawer as
+    # arrays of CarIdx into the DriverTable, updated from
+    # main.update_position() / main.update_drivers()
+
+    def __init__(self):
+        self.running = np.zeros(0, dtype=np.intp)
+        self.finished = np.zeros(0, dtype=np.intp)
+        self.results = np.zeros(0, dtype=np.intp)
+        self.version = 0
+        self._finished_sig = None
+        self._results_lead_lap = None
+
+    def update_running(self, drivers, cam_car_idx, track_length, intervals=None):
+        eligible = drivers.present & (drivers.lap_distance != -1) & ~np.isnan(drivers.overall_distance)
+
+        order = self.running
+        in_order = np.zeros(drivers.car_count, dtype=bool)
+        in_order[order] = True
+        changed = not np.array_equal(eligible, in_order)
+        if changed:
+            order = np.concatenate((order[eligible[order]], np.flatnonzero(eligible & ~in_order)))
+
+        keys = running_key(drivers, order)
+        if changed or (keys[:-1] < keys[1:]).any():
+            # stable, so equal keys keep their previous order
+            order = order[np.argsort(-keys, kind='stable')]
+            self.running = order
+            for i, car_idx in enumerate(order.tolist()):
+                drivers.position[car_idx] = str(i + 1)
+
+        self.update_gaps(drivers, cam_car_idx, track_length, intervals)
+        self.version += 1
+
+    def update_gaps(self, drivers, cam_car_idx, track_length, intervals=None):
+        running = self.running
+        if cam_car_idx not in drivers or np.isnan(drivers.overall_distance[cam_car_idx]):
+            drivers.gap[running] = np.nan
+            for car_idx in running.tolist():
+                drivers.gap_text[car_idx] = ''
+            return
+
+        distances = np.zeros(drivers.car_count)
+        distances[running] = drivers.overall_distance[running] - drivers.overall_distance[cam_car_idx]
+        if intervals is not None:
+            gaps = intervals.gaps_to(cam_car_idx, distances)
+        else:
+            gaps = np.full(drivers.car_count, np.nan)
+
+        # no checkpoint crossings yet, estimate from the distance
+        metres_per_percent = track_length * 10
+        estimate = distances * 100 * metres_per_percent / (90 / 2.23693629)
+        gaps = np.where(np.isnan(gaps), estimate, gaps)
+        drivers.gap[running] = gaps[running]
+        for car_idx, gap in zip(running.tolist(), gaps[running].tolist()):
+            drivers.gap_text[car_idx] = '' if car_idx == cam_car_idx else '{:0.01f}'.format(gap)
+        drivers.gap[cam_car_idx] = np.nan
+
+    def update_finished(self, drivers, drivers_on_lead_lap):
+        completed = np.flatnonzero(drivers.completed_race & drivers.has_result)
+        sig = np.stack((completed, drivers.result_position[completed], drivers.result_lap[completed],
+            drivers.result_time[completed] >= 0)).tobytes()
+        if sig != self._finished_sig:
+            self._finished_sig = sig
+            completed = completed[np.argsort(drivers.result_position[completed], kind='stable')]
+            self.finished = completed[drivers.result_time[completed] >= 0]
+            self._results_lead_lap = None
+
+        # show the lead lap until every driver on it has finished
+        if drivers_on_lead_lap != self._results_lead_lap:
+            self._results_lead_lap = drivers_on_lead_lap
+            lead_lap = self.finished[drivers.result_lap[self.finished] == 0]
+            self.results = self.finished if len(lead_lap) >= drivers_on_lead_lap else lead_lap
+            self.version += 1
+
+    def around(self, drivers, car_idx, count, track_location=None):
+        idx = self.running
+        if track_location is not None:
+            idx = idx[drivers.track_location[idx] == track_location]
+        cur_pos = np.flatnonzero(idx == car_idx)
+        if not len(cur_pos):
+            return idx[:0]
+        range_start = max(min(cur_pos[0] - count // 2, len(idx) - count), 0)
+        return idx[range_start:range_start + count]
@@ -1,11 +1,29 @@
 #!python3
 # -*- coding: utf-8 -*-
 
+import io
+import copy
+import json
+import numpy as np
+from drivertable import DriverTable
+from intervals import Intervals
+from reference import ReferenceLap
+from speeds import Speeds
+from standings import Standings
+from timing import LapTiming
+
+# the per-car tables a State holds
+TABLES = ('drivers', 'standings', 'intervals', 'speeds', 'timing', 'reference')
+
+
 class State:
     is_connected = False
+    frame = None
 
     last_session_num = -1
     last_session_state = -1
+    session_info_update = -1
+    drivers_info_update = -1
     my_car_idx = -1
     cam_car_idx = -1
 
@@ -27,11 +45,6 @@ class State:
     rpm_max = -1
     rpm_len = 10
 
-    drivers = {}
-    results_positions = []
-
-    speed_calc_data = []
-
     last_time_update_lap_ses_time = -1
 
     last_time_update_drivers = -1
@@ -42,5 +55,97 @@ class State:
 
     last_time_update_standing = -1
 
+    def __init__(self):
+        # per instance, a fresh State must not share tables with the last one
+        self.drivers = DriverTable()
+        self.results_positions = []
+        self.camera_groups = []
+        # replaced with ones for the track on a session change, but there
+        # from the start so a failed session info parse leaves usable tables
+        self.standings = Standings()
+        self.intervals = Intervals()
+        self.speeds = Speeds()
+        self.timing = LapTiming()
+        self.reference = ReferenceLap()
+
+    def __getstate__(self):
+        # the frame is a view over irsdk memory, it is read again every tick
+        values = self.__dict__.copy()
+        values.pop('frame', None)
+        return values
+
+    def snapshot(self):
+        # a copy for another thread to read while this one keeps updating,
+        # only the arrays and lists changed in place are copied
+        other = copy.copy(self)
+        for name in TABLES:
+            setattr(other, name, copy_tables(getattr(self, name)))
+        return other
+
+    def dumps(self):
+        # an npz archive of every array of the tables, with everything else
+        # as json in it; the frame and caches (underscored names) are left out
+        arrays = {}
+        values = {}
+        for name, value in vars(self).items():
+            if name == 'frame' or name.startswith('_'):
+                continue
+            if name not in TABLES:
+                values[name] = value
+                continue
+            values[name] = {}
+            for attr, table_value in vars(value).items():
+                if attr.startswith('_'):
+                    continue
+                if isinstance(table_value, np.ndarray):
+                    arrays['%s.%s' % (name, attr)] = table_value
+                else:
+                    values[name][attr] = table_value
+        arrays['values'] = np.frombuffer(json.dumps(values, default=json_value).encode('utf-8'), dtype=np.uint8)
+        f = io.BytesIO()
+        np.savez(f, **arrays)
+        return f.getvalue()
+
+    @classmethod
+    def loads(cls, data):
+        # a State from dumps(), over a fresh one so anything missing keeps
+        # its default; arrays are loaded without pickle
+        state = cls()
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            for name, value in json.loads(archive['values'].tobytes()).items():
+                if name not in TABLES:
+                    setattr(state, name, value)
+                    continue
+                table = getattr(state, name)
+                for attr, table_value in value.items():
+                    setattr(table, attr, table_value)
+            for key in archive.files:
+                if key != 'values':
+                    name, attr = key.split('.', 1)
+                    setattr(getattr(state, name), attr, archive[key])
+        return state
+
+    def restore(self, other):
+        # become other in place, windows and drawers keep their reference
+        self.__dict__.clear()
+        self.__dict__.update(other.__dict__)
+
     def raceTime(self):
         return self.cur_session_time - self.cur_session_state_time
+
+
+def copy_tables(obj):
+    other = copy.copy(obj)
+    for name, value in vars(obj).items():
+        if isinstance(value, np.ndarray):
+            setattr(other, name, value.copy())
+        elif isinstance(value, list):
+            setattr(other, name, list(value))
+    return other
+
+
+def json_value(value):
+    # numpy scalars read from the frame
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('%s is not serializable' % type(value).__name__)
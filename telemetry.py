@@ -0,0 +1,96 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# CarIdx arrays are this long
+CAR_COUNT = 64
+
+# irsdk var types: char, bool, int, bitfield, float, double
+VAR_DTYPES = (
+    np.dtype('S1'), np.dtype('?'), np.dtype('<i4'),
+    np.dtype('<u4'), np.dtype('<f4'), np.dtype('<f8'),
+)
+
+# every irsdk variable read by the update loop and the drawers
+FRAME_VARS = (
+    'SessionTime', 'SessionTick', 'SessionNum', 'SessionState',
+    'CamCarIdx', 'CamCameraNumber',
+    'IsReplayPlaying', 'ReplayFrameNumEnd',
+    'Speed', 'RPM', 'Gear', 'FuelLevel', 'Throttle', 'Brake',
+    'CarIdxLap', 'CarIdxLapDistPct', 'CarIdxTrackSurface', 'CarIdxRPM', 'CarIdxGear',
+)
+
+
+class TelemetryFrame:
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TelemetryFrame is read only')
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+
+def var_array(ir, name):
+    # view straight over the var buffer, no per-element python objects
+    var_header = ir._var_headers_dict[name]
+    var_buf = ir._var_buffer_latest
+    return np.frombuffer(var_buf.get_memory(), dtype=VAR_DTYPES[var_header.type],
+        count=var_header.count, offset=var_buf.buf_offset + var_header.offset)
+
+
+def read_frame(ir, names=FRAME_VARS):
+    # freeze so every value comes from the same irsdk tick, the frozen copy
+    # is read only bytes so the array views can't change under the drawers
+    ir.freeze_var_buffer_latest()
+    try:
+        var_headers = ir._var_headers_dict
+        values = {}
+        for name in names:
+            if name in var_headers and var_headers[name].count > 1:
+                values[name] = var_array(ir, name)
+            else:
+                values[name] = ir[name]
+    finally:
+        ir.unfreeze_var_buffer_latest()
+    return TelemetryFrame(values)
+
+
+def latest_tick(ir):
+    # cheap check for new data without freezing the var buffers
+    if not ir.is_initialized:
+        return None
+    return ir['SessionTick']
+
+
+def session_info_bytes(ir):
+    # the raw session info yaml as the sim wrote it
+    header = ir._header
+    start = header.session_info_offset
+    return bytes(ir._shared_mem[start:start + header.session_info_len]).rstrip(b'\x00')
+
+
+def forward_moves(last_pcts, pcts):
+    # lap distance every car covered since the last tick, and whether it
+    # moved at all: only moving forward by less than a quarter lap counts,
+    # anything else is a reset, a tow or a car leaving the world
+    travelled = (pcts - last_pcts) % 1
+    moving = (pcts >= 0) & (last_pcts >= 0) & (travelled < .25)
+    return travelled, moving
+
+
+def crossing_times(last_time, session_time, ahead, travelled):
+    # session time a car passed a point ahead of it, ahead and travelled in
+    # laps since the last tick, interpolated between the two ticks
+    frac = np.clip(ahead / np.maximum(travelled, 1e-9), 0, 1)
+    return last_time + frac * (session_time - last_time)
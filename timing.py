@@ -0,0 +1,118 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from telemetry import CAR_COUNT, forward_moves, crossing_times
+
+# completed laps kept per car
+HISTORY = 32
+
+
+class LapTiming:
+    # start/finish and sector line crossings of every car, timed to a fraction
+    # of a tick by interpolating the lap distance between ticks; sector 0
+    # starts at the start/finish line
+
+    def __init__(self, sector_starts=(0.0,), car_count=CAR_COUNT, history=HISTORY):
+        self.sector_starts = np.unique(np.append(np.asarray(sector_starts, dtype=np.float64), 0.0))
+        sectors = len(self.sector_starts)
+        self.history_len = history
+        self.last_pct = np.full(car_count, -1.0)
+        self.last_time = -1
+
+        # the sector each car is in and when it, and the lap, started; nan
+        # until the car crosses a line, a lap only counts when clean, timed
+        # through every sector in order
+        self.sector = np.full(car_count, -1, dtype=np.int32)
+        self.sector_start = np.full(car_count, np.nan)
+        self.lap_start = np.full(car_count, np.nan)
+        self.clean = np.zeros(car_count, dtype=bool)
+        self.sector_times = np.full((car_count, sectors), np.nan)
+
+        self.last_sector_times = np.full((car_count, sectors), np.nan)
+        self.best_sector_times = np.full((car_count, sectors), np.nan)
+        self.last_lap_time = np.full(car_count, np.nan)
+        self.best_lap_time = np.full(car_count, np.nan)
+        self.laps = np.zeros(car_count, dtype=np.int32)
+        self.history = np.full((car_count, history), np.nan)
+
+    def setSectors(self, sector_starts):
+        # sectors known only once the session info has them; laps timed so
+        # far are kept, the one in progress is not timed
+        sector_starts = np.unique(np.append(np.asarray(sector_starts, dtype=np.float64), 0.0))
+        if np.array_equal(sector_starts, self.sector_starts):
+            return
+        self.sector_starts = sector_starts
+        shape = (len(self.sector), len(sector_starts))
+        self.sector_times = np.full(shape, np.nan)
+        self.last_sector_times = np.full(shape, np.nan)
+        self.best_sector_times = np.full(shape, np.nan)
+        self.reset()
+
+    def reset(self, cars=slice(None)):
+        self.sector[cars] = -1
+        self.sector_start[cars] = np.nan
+        self.lap_start[cars] = np.nan
+        self.clean[cars] = False
+        self.sector_times[cars] = np.nan
+
+    def update(self, session_time, pcts):
+        if session_time < self.last_time:
+            self.reset()
+            self.last_pct.fill(-1)
+            self.last_time = -1
+
+        pcts = np.asarray(pcts, dtype=np.float64)
+        valid = pcts >= 0
+        travelled, moving = forward_moves(self.last_pct, pcts)
+        lost = (self.sector >= 0) & ~moving
+        if lost.any():
+            self.reset(lost)
+
+        if self.last_time >= 0:
+            # distance from each car to each line, crossed when covered
+            ahead = (self.sector_starts - self.last_pct[:, None]) % 1
+            crossed = (ahead > 0) & (ahead <= travelled[:, None]) & moving[:, None]
+            if crossed.any():
+                cars, sectors = np.nonzero(crossed)
+                times = crossing_times(self.last_time, session_time, ahead[cars, sectors], travelled[cars])
+                # a car can cross more than one line in a tick, in time order
+                for t, car_idx, sector in sorted(zip(times.tolist(), cars.tolist(), sectors.tolist())):
+                    self.cross(car_idx, sector, t)
+
+        self.last_pct = np.where(valid, pcts, -1)
+        self.last_time = session_time
+
+    def cross(self, car_idx, sector, t):
+        sectors = len(self.sector_starts)
+        previous = self.sector[car_idx]
+        if previous >= 0 and sector == (previous + 1) % sectors:
+            self.sector_times[car_idx, previous] = t - self.sector_start[car_idx]
+        else:
+            self.clean[car_idx] = False
+
+        if sector == 0:
+            if self.clean[car_idx]:
+                lap_time = t - self.lap_start[car_idx]
+                self.last_lap_time[car_idx] = lap_time
+                self.best_lap_time[car_idx] = np.fmin(self.best_lap_time[car_idx], lap_time)
+                self.last_sector_times[car_idx] = self.sector_times[car_idx]
+                self.best_sector_times[car_idx] = np.fmin(self.best_sector_times[car_idx], self.sector_times[car_idx])
+                self.history[car_idx, self.laps[car_idx] % self.history_len] = lap_time
+                self.laps[car_idx] += 1
+            self.lap_start[car_idx] = t
+            self.sector_times[car_idx] = np.nan
+            self.clean[car_idx] = True
+
+        self.sector[car_idx] = sector
+        self.sector_start[car_idx] = t
+
+    def lapTime(self, car_idx, session_time):
+        # time into the current lap, nan before the car's first start/finish
+        return session_time - self.lap_start[car_idx]
+
+    def lapHistory(self, car_idx):
+        # completed lap times, oldest first
+        count = min(self.laps[car_idx], self.history_len)
+        idx = np.arange(self.laps[car_idx] - count, self.laps[car_idx]) % self.history_len
+        return self.history[car_idx, idx]
@@ -0,0 +1,111 @@
+#!python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import zlib
+import logging
+import threading
+from PyQt5 import QtGui
+
+# bmp is uncompressed, png uses the fastest zlib level Qt offers
+FORMATS = {
+    'png': ('PNG', 80),
+    'bmp': ('BMP', -1),
+}
+
+
+class ImageWriter:
+    # writes overlay images to disk from a background thread so encoding and
+    # file io never stall painting; images come from a small pool of reused
+    # buffers, only the newest pending image is kept and writes are limited
+    # to rate per second
+
+    def __init__(self, path, fmt='png', rate=10, pool_size=3):
+        if fmt not in FORMATS:
+            raise ValueError('unknown image format %s' % fmt)
+        self.path = path
+        self.format, self.quality = FORMATS[fmt]
+        self.interval = 1 / rate if rate > 0 else 0
+        self.pool = []
+        self.pool_size = pool_size
+        self.allocated = 0
+        self.pending = None
+        self.last_crc = None
+        self.last_write = 0
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def acquire(self, width, height):
+        # a cleared image to paint into, None when every buffer is still busy
+        with self.cond:
+            while self.pool:
+                img = self.pool.pop()
+                if img.width() == width and img.height() == height:
+                    break
+                self.allocated -= 1
+            else:
+                if self.allocated >= self.pool_size:
+                    return None
+                self.allocated += 1
+                img = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+        img.fill(0)
+        return img
+
+    def submit(self, img):
+        with self.cond:
+            if self.pending is not None:
+                self.pool.append(self.pending)
+            self.pending = img
+            self.cond.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='ImageWriter', daemon=True)
+            self.thread.start()
+
+    def release(self, img):
+        with self.cond:
+            self.pool.append(img)
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                wait = self.last_write + self.interval - time.perf_counter()
+                if wait > 0:
+                    # newer images replace this one while we wait
+                    self.cond.wait(wait)
+                    continue
+                img = self.pending
+                self.pending = None
+            try:
+                self.write(img)
+            except Exception:
+                logging.exception('error writing %s' % self.path)
+            finally:
+                self.release(img)
+
+    def write(self, img):
+        bits = img.constBits()
+        bits.setsize(img.sizeInBytes())
+        crc = zlib.crc32(bits)
+        if crc == self.last_crc:
+            return
+        # write next to the target and rename over it so readers never see
+        # a partial file
+        tmp = '%s.tmp' % self.path
+        if not img.save(tmp, self.format, self.quality):
+            raise IOError('unable to save %s' % tmp)
+        os.replace(tmp, self.path)
+        self.last_crc = crc
+        self.last_write = time.perf_counter()